@@ -0,0 +1,203 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+from benchmarks.synthetic import grid_unwrap, icosphere, plane, sphere_nerf, write_corpus
+
+
+def _mesh(subdiv):
+    return icosphere(subdiv, seed=subdiv)
+
+
+def _corpus(work_dir, rows):
+    return write_corpus(os.path.join(work_dir, f"corpus_{rows}.jsonl"), rows, seed=rows)
+
+
+def _texts(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line)["text"] for line in f]
+
+
+def bake(params, work_dir):
+    from core.postprocess.bake_texture import bake_vertex_colors_to_texture
+
+    verts, faces, vcolors, uvs = grid_unwrap(*_mesh(params["subdiv"]))
+    tex_res = params["tex_res"]
+
+    def run():
+        bake_vertex_colors_to_texture(verts, faces, vcolors, uvs, tex_res=tex_res)
+    return run, tex_res * tex_res, "texels/s"
+
+
+def unwrap(params, work_dir):
+    from core.postprocess.uv_unwrap import unwrap_uv_xatlas
+
+    verts, faces, _ = _mesh(params["subdiv"])
+
+    def run():
+        unwrap_uv_xatlas(verts, faces)
+    return run, len(faces), "faces/s"
+
+
+def decimate(params, work_dir):
+    from core.postprocess.simplify import decimate_qem
+
+    verts, faces, vcolors = plane(params["plane"]) if "plane" in params else _mesh(params["subdiv"])
+    target = int(len(faces) * params["ratio"])
+    info = dict(target_faces=target)
+
+    def run():
+        # filled in by the runs: a stalled decimation shows up as faces_out > target_faces
+        info["faces_out"] = len(decimate_qem(verts, faces, vcolors, target_faces=target)[1])
+    return run, len(faces), "faces/s", info
+
+
+def export_obj(params, work_dir):
+    from core.postprocess.export_obj import export_obj_mtl_png
+
+    verts, faces, _, uvs = grid_unwrap(*_mesh(params["subdiv"]))
+    tex_res = params["tex_res"]
+    texture = np.random.default_rng(0).integers(0, 256, size=(tex_res, tex_res, 3), dtype=np.uint8)
+    out_dir = os.path.join(work_dir, "export")
+
+    def run():
+        export_obj_mtl_png(out_dir, "bench", verts, faces, uvs, texture)
+    return run, len(faces), "faces/s"
+
+
+def nerf(params, work_dir):
+    import torch
+
+    from core.generation.abstract.renderer import OccupancyGrid, get_rays, orbit_pose, render_rays
+
+    model = sphere_nerf(params["encoding"])
+    grid = OccupancyGrid(resolution=32)
+    with torch.no_grad():
+        occupied = grid.update(model)
+    # march every sample unless accelerated
+    kwargs = dict(grid=grid) if params["accel"] else dict(min_transmittance=0.0)
+    rays_o, rays_d = get_rays(orbit_pose(30.0, 20.0), params["res"], params["res"])
+    info = dict(occupied=occupied)
+    if params["accel"]:
+        # image error of empty-space skipping vs the same render without the grid
+        with torch.no_grad():
+            ref = render_rays(model, rays_o, rays_d, num_samples=params["samples"])["rgb"]
+            out = render_rays(model, rays_o, rays_d, num_samples=params["samples"], **kwargs)["rgb"]
+        info["max_drgb"] = round((out - ref).abs().max().item(), 6)
+
+    @torch.no_grad()
+    def run():
+        render_rays(model, rays_o, rays_d, num_samples=params["samples"], **kwargs)
+    return run, len(rays_o), "rays/s", info
+
+
+def encoder(params, work_dir):
+    from core.semantics.text_encoder import FrozenSentenceEncoder
+
+    texts = _texts(_corpus(work_dir, params["rows"]))
+    enc = FrozenSentenceEncoder(device="cpu")
+
+    def run():
+        enc(texts)
+    return run, len(texts), "rows/s"
+
+
+def ellm(params, work_dir):
+    from core.datasets.ugc_dataset import UGCDataset
+    from core.semantics.bertopic_llm import ELLM
+    from core.semantics.text_encoder import FrozenSentenceEncoder
+
+    ds = UGCDataset(_corpus(work_dir, params["rows"]), image_root="")
+    texts = [it["text"] for it in ds.items]
+    times = [it["timestamp"] for it in ds.items]
+    model = ELLM(
+        text_encoder=FrozenSentenceEncoder(device="cpu"),
+        topic_k=params["topic_k"], use_bertopic=False, llm_filter="heuristic", device="cpu",
+    )
+
+    def run():
+        model(texts, times)
+    return run, len(texts), "rows/s"
+
+
+def dataset(params, work_dir):
+    from core.datasets.ugc_dataset import UGCDataset
+
+    mode = params["mode"]
+    src = _corpus(work_dir, params["rows"])
+    # private copy, so index / columnar caches never leak between cases
+    path = os.path.join(work_dir, f"dataset_{mode}_{params['rows']}.jsonl")
+    if not os.path.exists(path):
+        shutil.copyfile(src, path)
+    kwargs = dict(lazy=mode == "lazy", columnar=mode == "columnar")
+
+    def clear():
+        if os.path.exists(path + ".idx.npz"):
+            os.remove(path + ".idx.npz")
+        shutil.rmtree(path + ".cols", ignore_errors=True)
+
+    clear()
+    if params.get("cache") == "warm":
+        UGCDataset(path, image_root="", **kwargs)
+
+    def run():
+        if params.get("cache") != "warm":
+            clear()
+        ds = UGCDataset(path, image_root="", **kwargs)
+        n = sum(len(chunk) for chunk in ds.iter_chunks(4096))
+        assert n == params["rows"]
+    return run, params["rows"], "rows/s"
+
+
+# name -> (setup, {preset: [params, ...]}); setup(params, work_dir) returns
+# (run, work units per run, throughput unit)
+CASES = {
+    "bake": (bake, {
+        "quick": [dict(subdiv=4, tex_res=r) for r in (512, 1024)],
+        "full": [dict(subdiv=s, tex_res=r) for s in (4, 6) for r in (512, 1024, 2048, 4096)],
+    }),
+    "unwrap": (unwrap, {
+        "quick": [dict(subdiv=4)],
+        "full": [dict(subdiv=s) for s in (4, 5, 6)],
+    }),
+    "decimate": (decimate, {
+        "quick": [dict(subdiv=5, ratio=0.25), dict(plane=100, ratio=0.05)],
+        "full": [dict(subdiv=s, ratio=0.25) for s in (5, 6, 7)] + [dict(plane=n, ratio=0.05) for n in (100, 300)],
+    }),
+    "export_obj": (export_obj, {
+        "quick": [dict(subdiv=4, tex_res=1024)],
+        "full": [dict(subdiv=s, tex_res=r) for s in (4, 6) for r in (1024, 4096)],
+    }),
+    "nerf": (nerf, {
+        "quick": [dict(encoding=e, accel=a, res=64, samples=128) for e in (None, "hashgrid") for a in (False, True)],
+        "full": [
+            dict(encoding=e, accel=a, res=r, samples=s)
+            for e in (None, "hashgrid") for a in (False, True) for r in (64, 128) for s in (64, 128)
+        ],
+    }),
+    "encoder": (encoder, {
+        "quick": [dict(rows=10_000)],
+        "full": [dict(rows=n) for n in (10_000, 100_000, 1_000_000)],
+    }),
+    # capped at 100k: full-batch ELLM holds the dense [N,768] float32 embeddings
+    # (plus the encoder's concatenation and KMeans's centered copy), ~10 GB at 1M
+    "ellm": (ellm, {
+        "quick": [dict(rows=10_000, topic_k=12)],
+        "full": [dict(rows=n, topic_k=12) for n in (10_000, 100_000)],
+    }),
+    "dataset": (dataset, {
+        "quick": [
+            dict(rows=10_000, mode="eager"),
+            dict(rows=10_000, mode="lazy", cache="cold"),
+            dict(rows=10_000, mode="columnar", cache="cold"),
+            dict(rows=10_000, mode="columnar", cache="warm"),
+        ],
+        "full": [
+            dict(rows=n, mode="eager") if m == "eager" else dict(rows=n, mode=m, cache=c)
+            for n in (10_000, 100_000, 1_000_000)
+            for m, c in (("eager", None), ("lazy", "cold"), ("lazy", "warm"), ("columnar", "cold"), ("columnar", "warm"))
+        ],
+    }),
+}
@@ -0,0 +1,167 @@
+import argparse
+import importlib.metadata
+import json
+import multiprocessing as mp
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+def case_id(name, params):
+    return f"{name}[" + ",".join(f"{k}={v}" for k, v in params.items()) + "]"
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KiB elsewhere
+
+
+def _measure(name, params, work_dir, repeats, warmup):
+    # runs in a fresh process, so peak RSS belongs to this case only
+    from benchmarks.cases import CASES
+
+    # a case may add a dict of facts about its input / output to its result (read after the runs)
+    run, units, unit, *info = CASES[name][0](params, work_dir)
+    setup_rss = _peak_rss_mb()
+    for _ in range(warmup):
+        run()
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - t0)
+    median = statistics.median(times)
+    return dict(
+        seconds=median, min_seconds=min(times), times=times,
+        throughput=units / median if median > 0 else None, unit=unit,
+        setup_rss_mb=setup_rss, peak_rss_mb=_peak_rss_mb(), info=info[0] if info else None,
+    )
+
+
+def run_case(name, params, work_dir, repeats=3, warmup=1):
+    """
+    Time one case in its own spawned process; a failure (including a native
+    crash, e.g. in xatlas) is recorded as the case's error.
+    """
+    res = dict(id=case_id(name, params), name=name, params=params, error=None)
+    with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn")) as pool:
+        try:
+            res.update(pool.submit(_measure, name, params, work_dir, repeats, warmup).result())
+        except BrokenProcessPool:
+            res["error"] = "benchmark process crashed"
+        except Exception as e:
+            res["error"] = f"{type(e).__name__}: {e}"
+    return res
+
+
+def _meta(preset, repeats, warmup):
+    import numpy as np
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    try:
+        # not imported: on Linux spawned children inherit this process's peak RSS
+        torch_version = importlib.metadata.version("torch")
+    except importlib.metadata.PackageNotFoundError:
+        torch_version = None
+    return dict(
+        time=time.strftime("%Y-%m-%dT%H:%M:%S"), commit=commit, preset=preset,
+        repeats=repeats, warmup=warmup, python=platform.python_version(),
+        numpy=np.__version__, torch=torch_version, platform=platform.platform(),
+        cpu_count=os.cpu_count(),
+    )
+
+
+def compare(results, baseline, threshold=0.15):
+    """
+    Compare with a baseline run (same case ids) on the fastest repeat,
+    which is the least sensitive to background noise.
+
+    Returns:
+      list of (id, base_seconds, seconds, ratio, status); status is
+      "regression" (slower by more than `threshold`), "improved" (faster by
+      more than `threshold`), "ok", "new" or "error"
+    """
+    base = {r["id"]: r for r in baseline["results"] if r.get("error") is None}
+    rows = []
+    for r in results["results"]:
+        b = base.get(r["id"])
+        if r.get("error") is not None:
+            rows.append((r["id"], b and b["min_seconds"], None, None, "error"))
+        elif b is None:
+            rows.append((r["id"], None, r["min_seconds"], None, "new"))
+        else:
+            ratio = r["min_seconds"] / b["min_seconds"]
+            status = "regression" if ratio > 1 + threshold else "improved" if ratio < 1 - threshold else "ok"
+            rows.append((r["id"], b["min_seconds"], r["min_seconds"], ratio, status))
+    return rows
+
+
+def _fmt(x, spec):
+    return "-" if x is None else format(x, spec)
+
+
+def main(argv=None):
+    from benchmarks.cases import CASES
+
+    ap = argparse.ArgumentParser(description="CoX-3D hot path benchmarks (CPU, synthetic inputs)")
+    ap.add_argument("--preset", choices=("quick", "full"), default="quick")
+    ap.add_argument("--cases", type=str, default=None, help=f"comma-separated subset of {','.join(CASES)}")
+    ap.add_argument("--repeats", type=int, default=3)
+    ap.add_argument("--warmup", type=int, default=1)
+    ap.add_argument("--work_dir", type=str, default="outputs/bench_data", help="synthetic inputs (reused)")
+    ap.add_argument("--out", type=str, default="outputs/bench_results.json")
+    ap.add_argument("--baseline", type=str, default=None, help="results JSON to compare against")
+    ap.add_argument("--threshold", type=float, default=0.15, help="allowed slowdown vs baseline (0.15 = 15%%)")
+    args = ap.parse_args(argv)
+
+    names = args.cases.split(",") if args.cases else list(CASES)
+    for name in names:
+        if name not in CASES:
+            raise ValueError(f"Unknown benchmark case: {name}")
+    os.makedirs(args.work_dir, exist_ok=True)
+
+    results = dict(meta=_meta(args.preset, args.repeats, args.warmup), results=[])
+    for name in names:
+        for params in CASES[name][1][args.preset]:
+            r = run_case(name, params, os.path.abspath(args.work_dir), args.repeats, args.warmup)
+            results["results"].append(r)
+            if r["error"] is not None:
+                print(f"{r['id']:<55} ERROR {r['error']}")
+            else:
+                print(
+                    f"{r['id']:<55} {r['seconds']:9.4f}s  {r['throughput']:12.4g} {r['unit']:<9}"
+                    f" peak {r['peak_rss_mb']:7.1f} MB"
+                    + "".join(f"  {k} {v:.4g}" for k, v in (r["info"] or {}).items())
+                )
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"[Bench] Results saved to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline, args.threshold)
+        print(f"\n[Bench] vs {args.baseline} (threshold {args.threshold:.0%}):")
+        for cid, b, s, ratio, status in rows:
+            print(f"{cid:<55} {_fmt(b, '9.4f')} -> {_fmt(s, '9.4f')}  x{_fmt(ratio, '5.2f')}  {status}")
+        regressions = [r for r in rows if r[4] == "regression"]
+        if regressions:
+            print(f"[Bench] {len(regressions)} regression(s)")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
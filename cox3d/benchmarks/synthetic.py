@@ -0,0 +1,142 @@
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from core.semantics.term_matcher import DEFAULT_DESIGN_TERMS
+
+_FILLER = [
+    "今天", "看到", "这款", "新品", "真的", "有点", "非常", "喜欢", "设计", "产品",
+    "感觉", "一般", "推荐", "大家", "价格", "性价比", "外观", "体验", "朋友", "分享",
+]
+
+
+def icosphere(subdiv: int, seed: int = 0):
+    """
+    Unit icosphere with 20 * 4**subdiv faces and random uint8 vertex colors.
+
+    Returns:
+      verts [V,3] float32, faces [F,3] int32, vcolors [V,3] uint8
+    """
+    t = (1 + 5 ** 0.5) / 2
+    verts = np.array([
+        (-1, t, 0), (1, t, 0), (-1, -t, 0), (1, -t, 0), (0, -1, t), (0, 1, t),
+        (0, -1, -t), (0, 1, -t), (t, 0, -1), (t, 0, 1), (-t, 0, -1), (-t, 0, 1),
+    ], dtype=np.float64)
+    faces = np.array([
+        (0, 11, 5), (0, 5, 1), (0, 1, 7), (0, 7, 10), (0, 10, 11), (1, 5, 9), (5, 11, 4),
+        (11, 10, 2), (10, 7, 6), (7, 1, 8), (3, 9, 4), (3, 4, 2), (3, 2, 6), (3, 6, 8),
+        (3, 8, 9), (4, 9, 5), (2, 4, 11), (6, 2, 10), (8, 6, 7), (9, 8, 1),
+    ], dtype=np.int64)
+    for _ in range(subdiv):
+        # one midpoint per unique edge, then split every face into four
+        e = np.sort(faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+        uniq, inv = np.unique(e, axis=0, return_inverse=True)
+        mid = len(verts) + inv.reshape(-1, 3)
+        verts = np.concatenate([verts, 0.5 * (verts[uniq[:, 0]] + verts[uniq[:, 1]])])
+        a, b, c = faces.T
+        ab, bc, ca = mid.T
+        faces = np.concatenate([
+            np.stack([a, ab, ca], 1), np.stack([b, bc, ab], 1),
+            np.stack([c, ca, bc], 1), np.stack([ab, bc, ca], 1),
+        ])
+    verts /= np.linalg.norm(verts, axis=1, keepdims=True)
+    rng = np.random.default_rng(seed)
+    vcolors = rng.integers(0, 256, size=(len(verts), 3), dtype=np.uint8)
+    return verts.astype(np.float32), faces.astype(np.int32), vcolors
+
+
+def plane(n: int, seed: int = 0):
+    """
+    Flat axis-aligned n x n vertex grid over the unit square, vertices in scan
+    order (like the flat regions of a marching-cubes mesh), with random uint8
+    vertex colors. Every collapse on it ties at zero quadric error.
+
+    Returns:
+      verts [n*n,3] float32, faces [2(n-1)^2,3] int32, vcolors [n*n,3] uint8
+    """
+    i, j = np.meshgrid(np.arange(n), np.arange(n), indexing="ij")
+    verts = np.stack([i.ravel(), j.ravel(), np.zeros(n * n)], axis=1) / (n - 1)
+    a = (np.arange(n - 1)[:, None] * n + np.arange(n - 1)[None, :]).ravel()
+    faces = np.concatenate([np.stack([a, a + n, a + 1], 1), np.stack([a + 1, a + n, a + n + 1], 1)])
+    vcolors = np.random.default_rng(seed).integers(0, 256, size=(len(verts), 3), dtype=np.uint8)
+    return verts.astype(np.float32), faces.astype(np.int32), vcolors
+
+
+def grid_unwrap(verts, faces, vcolors):
+    """
+    Deterministic stand-in for a UV unwrap (no xatlas needed): every face
+    gets its own cell of a square grid, with vertices split per face.
+
+    Returns:
+      verts [3F,3], faces [F,3] int32, vcolors [3F,3], uvs [3F,2] float32
+    """
+    n = len(faces)
+    g = int(np.ceil(np.sqrt(n)))
+    cell = np.arange(n)
+    base = np.stack([cell % g, cell // g], axis=1).astype(np.float32) / g
+    corner = np.array([[0.1, 0.1], [0.9, 0.1], [0.1, 0.9]], dtype=np.float32) / g
+    uvs = (base[:, None, :] + corner[None]).reshape(-1, 2)
+    vmap = faces.reshape(-1)
+    return verts[vmap], np.arange(3 * n, dtype=np.int32).reshape(n, 3), vcolors[vmap], uvs
+
+
+def sphere_nerf(encoding=None, max_steps=3000, empty_sigma=0.01, leak=0.01, seed=0):
+    """
+    NeRF fitted to an opaque sphere of radius 0.5 (position-coloured), so
+    empty-space skipping and early termination see a realistic sparse scene.
+
+    Trains until empty space is empty: fewer than `leak` of the batch's
+    points outside radius 0.6 keep a density above `empty_sigma` (the
+    OccupancyGrid threshold), or `max_steps` (raw xyz needs ~1k steps, the
+    hash grid ~100).
+    """
+    import torch
+
+    from core.generation.abstract.nerf import NeRF
+
+    torch.manual_seed(seed)
+    model = NeRF(encoding=encoding, hidden=64)
+    opt = torch.optim.Adam(model.parameters(), lr=1e-2)
+    for _ in range(max_steps):
+        x = torch.rand(4096, 3) * 2 - 1
+        sigma, rgb = model.query(x)
+        r = x.norm(dim=-1)
+        target = torch.where(r < 0.5, 50.0, 0.0)
+        loss = ((sigma - target) ** 2).mean() + ((rgb - (x * 0.5 + 0.5)) ** 2).mean()
+        opt.zero_grad()
+        loss.backward()
+        opt.step()
+        if (sigma.detach()[r > 0.6] > empty_sigma).float().mean() < leak:
+            break
+    return model.eval()
+
+
+def write_corpus(path: str, rows: int, seed: int = 0, chunk: int = 100_000):
+    """
+    Synthetic UGC JSONL corpus: short posts mixing filler words and design
+    terms, timestamps spread over one year. Reused if `path` exists.
+    """
+    if os.path.exists(path):
+        return path
+    rng = np.random.default_rng(seed)
+    vocab = np.array(_FILLER + DEFAULT_DESIGN_TERMS, dtype=object)
+    t0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    tmp = path + ".tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(tmp, "w", encoding="utf-8") as f:
+        for s in range(0, rows, chunk):
+            m = min(chunk, rows - s)
+            lengths = rng.integers(4, 24, size=m)
+            words = vocab[rng.integers(0, len(vocab), size=int(lengths.sum()))]
+            secs = np.sort(rng.integers(0, 365 * 86400, size=m))
+            ends = np.cumsum(lengths)
+            lines = []
+            for i in range(m):
+                text = "".join(words[ends[i] - lengths[i]:ends[i]])
+                ts = (t0 + timedelta(seconds=int(secs[i]))).isoformat()
+                lines.append(json.dumps({"text": text, "timestamp": ts, "image_path": ""}, ensure_ascii=False))
+            f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
+    return path
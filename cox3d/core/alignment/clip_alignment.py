@@ -1,6 +1,11 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 import torch
 from PIL import Image
 
+from core.semantics.embedding_cache import file_key
+
 try:
     import clip
     _HAS_CLIP = True
@@ -12,30 +17,166 @@ class CLIPAligner:
     """
     Optional CLIP alignment module (kept for methodological completeness).
     The minimal runnable instantiation does not depend on this module.
+
+    embedding_cache: optional EmbeddingCache; text embeddings are keyed by the
+    text, image embeddings by the image file's content hash.
+
+    Bulk APIs (`encode_texts`, `encode_image_paths`) run the model on
+    batches of at most `batch_size` and return L2-normalized embeddings;
+    images are decoded and preprocessed in a thread pool of `num_workers`,
+    `prefetch` batches ahead of the model. `topk` searches text-to-image
+    similarity with blocked matrix multiplies.
+
+    pad_batches=True pads the last batch to `batch_size`, keeping one static
+    shape for CUDA graphs / torch.compile. It is off by default, since a
+    short batch would otherwise pay for a full one.
     """
-    def __init__(self, device="cuda"):
+    model_name = "ViT-B/32"
+
+    def __init__(self, device="cuda", embedding_cache=None, batch_size=256, num_workers=8, prefetch=2,
+                 pad_batches=False):
         self.device = device if torch.cuda.is_available() else "cpu"
+        self.embedding_cache = embedding_cache
+        self.batch_size = int(batch_size)
+        self.num_workers = int(num_workers)
+        self.prefetch = int(prefetch)
+        self.pad_batches = bool(pad_batches)
         if not _HAS_CLIP:
             self.model = None
             self.preprocess = None
             return
-        self.model, self.preprocess = clip.load("ViT-B/32", device=self.device)
+        self.model, self.preprocess = clip.load(self.model_name, device=self.device)
         self.model.eval()
+        self.embed_dim = self.model.text_projection.shape[1]
+
+    def _store(self, modality: str):
+        return self.embedding_cache.store(f"clip-{self.model_name}-{modality}", self.embed_dim)
+
+    def _encode_texts(self, texts):
+        tokens = clip.tokenize(list(texts)).to(self.device)
+        return self.model.encode_text(tokens)
+
+    def _encode_image_paths(self, image_paths):
+        imgs = [self.preprocess(Image.open(p).convert("RGB")) for p in image_paths]
+        return self.model.encode_image(torch.stack(imgs, dim=0).to(self.device))
 
     @torch.no_grad()
     def encode_text(self, text: str):
         if self.model is None:
             raise RuntimeError("CLIP is not installed.")
-        tokens = clip.tokenize([text]).to(self.device)
-        return self.model.encode_text(tokens)
+        if self.embedding_cache is not None:
+            vec = self._store("text").encode([text], self._encode_texts)
+            return torch.from_numpy(vec).to(self.device)
+        return self._encode_texts([text])
 
     @torch.no_grad()
     def encode_image_path(self, image_path: str):
         if self.model is None:
             raise RuntimeError("CLIP is not installed.")
-        img = Image.open(image_path).convert("RGB")
-        img_t = self.preprocess(img).unsqueeze(0).to(self.device)
-        return self.model.encode_image(img_t)
+        if self.embedding_cache is not None:
+            vec = self._store("image").encode(
+                [image_path], self._encode_image_paths, keys=[file_key(image_path)]
+            )
+            return torch.from_numpy(vec).to(self.device)
+        return self._encode_image_paths([image_path])
+
+    def _pad(self, x):
+        # keep the model on one static batch shape (opt-in)
+        n = x.shape[0]
+        if not self.pad_batches or n == self.batch_size:
+            return x
+        pad = x.new_zeros((self.batch_size - n,) + tuple(x.shape[1:]))
+        return torch.cat([x, pad], dim=0)
+
+    def _load_image(self, path):
+        with Image.open(path) as im:
+            return self.preprocess(im.convert("RGB"))
+
+    def _encode_texts_batched(self, texts):
+        out = []
+        for s in range(0, len(texts), self.batch_size):
+            chunk = list(texts[s:s + self.batch_size])
+            tokens = self._pad(clip.tokenize(chunk)).to(self.device)
+            out.append(self.model.encode_text(tokens)[:len(chunk)].float())
+        return torch.cat(out, dim=0) if out else torch.zeros((0, self.embed_dim), device=self.device)
+
+    def _encode_images_batched(self, image_paths):
+        out = []
+
+        def run(futs):
+            imgs = torch.stack([f.result() for f in futs], dim=0)
+            x = self._pad(imgs).to(self.device, non_blocking=True)
+            out.append(self.model.encode_image(x)[:len(futs)].float())
+
+        with ThreadPoolExecutor(max_workers=self.num_workers) as pool:
+            pending = deque()
+            for s in range(0, len(image_paths), self.batch_size):
+                # decode up to `prefetch` batches ahead of the model
+                pending.append([pool.submit(self._load_image, p) for p in image_paths[s:s + self.batch_size]])
+                if len(pending) > self.prefetch:
+                    run(pending.popleft())
+            while pending:
+                run(pending.popleft())
+        return torch.cat(out, dim=0) if out else torch.zeros((0, self.embed_dim), device=self.device)
+
+    @staticmethod
+    def _normalize(x):
+        return x / (x.norm(dim=-1, keepdim=True) + 1e-6)
+
+    @torch.no_grad()
+    def encode_texts(self, texts):
+        """
+        Returns:
+          [N, D] L2-normalized text embeddings
+        """
+        if self.model is None:
+            raise RuntimeError("CLIP is not installed.")
+        texts = list(texts)
+        if self.embedding_cache is not None:
+            vec = self._store("text").encode(texts, self._encode_texts_batched)
+            return self._normalize(torch.from_numpy(vec).to(self.device))
+        return self._normalize(self._encode_texts_batched(texts))
+
+    @torch.no_grad()
+    def encode_image_paths(self, image_paths):
+        """
+        Returns:
+          [N, D] L2-normalized image embeddings
+        """
+        if self.model is None:
+            raise RuntimeError("CLIP is not installed.")
+        image_paths = list(image_paths)
+        if self.embedding_cache is not None:
+            with ThreadPoolExecutor(max_workers=self.num_workers) as pool:
+                keys = list(pool.map(file_key, image_paths))
+            vec = self._store("image").encode(image_paths, self._encode_images_batched, keys=keys)
+            return self._normalize(torch.from_numpy(vec).to(self.device))
+        return self._normalize(self._encode_images_batched(image_paths))
+
+    @staticmethod
+    @torch.no_grad()
+    def topk(queries, keys, k=5, block_size=8192):
+        """
+        Top-k cosine similarity of every query against all keys, computed as
+        blocked matrix multiplies (memory ~ queries x block_size) with a
+        running top-k merge.
+
+        Returns:
+          scores [Q, k], indices [Q, k] (k clipped to the number of keys)
+        """
+        q = CLIPAligner._normalize(queries.float())
+        k = min(int(k), keys.shape[0])
+        best_s = q.new_full((q.shape[0], 0), float("-inf"))
+        best_i = torch.zeros((q.shape[0], 0), dtype=torch.long, device=q.device)
+        for s in range(0, keys.shape[0], block_size):
+            kb = CLIPAligner._normalize(keys[s:s + block_size].to(q.device).float())
+            sim = q @ kb.T
+            bs, bi = sim.topk(min(k, sim.shape[1]), dim=1)
+            cand_s = torch.cat([best_s, bs], dim=1)
+            cand_i = torch.cat([best_i, bi + s], dim=1)
+            best_s, idx = cand_s.topk(min(k, cand_s.shape[1]), dim=1)
+            best_i = cand_i.gather(1, idx)
+        return best_s, best_i
 
     @staticmethod
     def cosine(a, b):
@@ -0,0 +1,236 @@
+import hashlib
+import json
+import os
+import shutil
+from array import array
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+CACHE_VERSION = 2
+
+NO_TIME = np.iinfo(np.int64).min   # row without timestamp
+NAIVE_TZ = np.iinfo(np.int32).min  # timestamp without tzinfo
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_EPOCH_NAIVE = datetime(1970, 1, 1)
+_US = timedelta(microseconds=1)
+
+
+def to_epoch_us(dt: datetime):
+    """
+    datetime -> (epoch microseconds, utc offset seconds or NAIVE_TZ).
+    Naive datetimes are counted as if they were UTC.
+    """
+    if dt is None:
+        return NO_TIME, NAIVE_TZ
+    if dt.tzinfo is None:
+        return (dt - _EPOCH_NAIVE) // _US, NAIVE_TZ
+    return (dt - _EPOCH) // _US, dt.utcoffset() // timedelta(seconds=1)
+
+
+def from_epoch_us(us: int, tz_offset: int):
+    if us == NO_TIME:
+        return None
+    if tz_offset == NAIVE_TZ:
+        return _EPOCH_NAIVE + timedelta(microseconds=int(us))
+    tz = timezone(timedelta(seconds=int(tz_offset)))
+    return (_EPOCH + timedelta(microseconds=int(us))).astimezone(tz)
+
+
+def file_sha1(path: str, block: int = 1 << 24):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for buf in iter(lambda: f.read(block), b""):
+            h.update(buf)
+    return h.hexdigest()
+
+
+class _StringColumnWriter:
+    def __init__(self, path: str):
+        self.path = path
+        self.f = open(path + ".bin", "wb")
+        self.offsets = array("q", [0])
+        self.end = 0
+
+    def add(self, s: str):
+        b = s.encode("utf-8")
+        self.f.write(b)
+        self.end += len(b)
+        self.offsets.append(self.end)
+
+    def close(self):
+        self.f.close()
+        np.save(self.path + ".off.npy", np.frombuffer(self.offsets, dtype=np.int64))
+
+
+class StringColumn:
+    """
+    Variable-length UTF-8 strings stored as one bytes buffer + int64 offsets,
+    both memory-mapped.
+    """
+
+    def __init__(self, path: str):
+        self.offsets = np.load(path + ".off.npy", mmap_mode="r")
+        if os.path.getsize(path + ".bin"):
+            self.data = np.memmap(path + ".bin", dtype=np.uint8, mode="r")
+        else:
+            self.data = np.zeros(0, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx: int):
+        return self.data[self.offsets[idx]:self.offsets[idx + 1]].tobytes().decode("utf-8")
+
+    def slice(self, start: int, stop: int):
+        """
+        Strings [start, stop) from one contiguous bytes read.
+        """
+        off = np.asarray(self.offsets[start:stop + 1])
+        buf = self.data[off[0]:off[-1]].tobytes()
+        off = (off - off[0]).tolist()
+        return [buf[a:b].decode("utf-8") for a, b in zip(off, off[1:])]
+
+
+def build_columnar_cache(src_path: str, cache_dir: str, rows):
+    """
+    One-time conversion of parsed UGC rows into a columnar layout:
+
+      text.{bin,off.npy}        UTF-8 bytes + offsets
+      image_path.{bin,off.npy}  raw (relative) image paths
+      extra.{bin,off.npy}       remaining fields as JSON ("" if none)
+      timestamp_us.npy          int64 epoch microseconds (NO_TIME if missing)
+      tz_offset.npy             int32 UTC offset seconds (NAIVE_TZ if naive)
+      meta.json                 source size / mtime / sha1 for invalidation
+
+    rows: iterable of dicts with `text`, `timestamp` (datetime or None) and
+    optional `image_path`.
+    """
+    tmp_dir = cache_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    text = _StringColumnWriter(os.path.join(tmp_dir, "text"))
+    image = _StringColumnWriter(os.path.join(tmp_dir, "image_path"))
+    extra = _StringColumnWriter(os.path.join(tmp_dir, "extra"))
+    ts, tz = array("q"), array("i")
+    for obj in rows:
+        text.add(obj.get("text", ""))
+        image.add(obj.get("image_path", "") or "")
+        rest = {k: v for k, v in obj.items() if k not in ("text", "timestamp", "image_path")}
+        extra.add(json.dumps(rest, ensure_ascii=False) if rest else "")
+        us, off = to_epoch_us(obj.get("timestamp"))
+        ts.append(us)
+        tz.append(off)
+    for col in (text, image, extra):
+        col.close()
+    np.save(os.path.join(tmp_dir, "timestamp_us.npy"), np.frombuffer(ts, dtype=np.int64))
+    np.save(os.path.join(tmp_dir, "tz_offset.npy"), np.frombuffer(tz, dtype=np.int32))
+
+    st = os.stat(src_path)
+    meta = {
+        "version": CACHE_VERSION,
+        "source": os.path.abspath(src_path),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "sha1": file_sha1(src_path),
+        "rows": len(ts),
+    }
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.replace(tmp_dir, cache_dir)
+
+
+def columnar_cache_is_valid(src_path: str, cache_dir: str):
+    """
+    Valid when the source has the recorded size and either the same mtime or
+    (after a touch/copy) the same sha1.
+    """
+    meta_path = os.path.join(cache_dir, "meta.json")
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    st = os.stat(src_path)
+    if meta.get("version") != CACHE_VERSION or meta.get("size") != st.st_size:
+        return False
+    if meta.get("mtime_ns") == st.st_mtime_ns:
+        return True
+    if meta.get("sha1") != file_sha1(src_path):
+        return False
+    meta["mtime_ns"] = st.st_mtime_ns
+    try:
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+    except OSError:
+        pass
+    return True
+
+
+class ColumnarTable:
+    """
+    Memory-mapped view of a columnar UGC cache (near-zero load time).
+    Pickles by path, so worker processes re-map instead of copying.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.text = StringColumn(os.path.join(cache_dir, "text"))
+        self.image_path = StringColumn(os.path.join(cache_dir, "image_path"))
+        self.extra = StringColumn(os.path.join(cache_dir, "extra"))
+        self.timestamp_us = np.load(os.path.join(cache_dir, "timestamp_us.npy"), mmap_mode="r")
+        self.tz_offset = np.load(os.path.join(cache_dir, "tz_offset.npy"), mmap_mode="r")
+
+    def __reduce__(self):
+        return (ColumnarTable, (self.cache_dir,))
+
+    def __len__(self):
+        return len(self.timestamp_us)
+
+    def timestamp(self, idx: int):
+        return from_epoch_us(int(self.timestamp_us[idx]), int(self.tz_offset[idx]))
+
+    def timestamps(self, start: int, stop: int):
+        """
+        Datetimes of rows [start, stop) (None where missing), converted in bulk
+        through datetime64 instead of per-row timedelta arithmetic.
+        """
+        us = np.asarray(self.timestamp_us[start:stop])
+        tz = np.asarray(self.tz_offset[start:stop])
+        naive = tz == NAIVE_TZ
+        local = us + np.where(naive, 0, tz).astype(np.int64) * 1_000_000
+        out = local.astype("datetime64[us]").tolist()
+        zones = {}
+        for i in np.flatnonzero(~naive).tolist():
+            off = int(tz[i])
+            if off not in zones:
+                zones[off] = timezone(timedelta(seconds=off))
+            out[i] = out[i].replace(tzinfo=zones[off])
+        for i in np.flatnonzero(us == NO_TIME).tolist():
+            out[i] = None
+        return out
+
+    def time_range(self, start: datetime = None, end: datetime = None):
+        """
+        Row indices with start <= timestamp < end, via vectorized comparisons.
+        """
+        ts = np.asarray(self.timestamp_us)
+        keep = ts != NO_TIME
+        if start is not None:
+            keep &= ts >= to_epoch_us(start)[0]
+        if end is not None:
+            keep &= ts < to_epoch_us(end)[0]
+        return np.flatnonzero(keep)
+
+
+def open_columnar_cache(src_path: str, cache_dir: str, rows_fn):
+    """
+    Open the cache for `src_path`, (re)building it from `rows_fn()` when stale.
+    """
+    if not columnar_cache_is_valid(src_path, cache_dir):
+        build_columnar_cache(src_path, cache_dir, rows_fn())
+    return ColumnarTable(cache_dir)
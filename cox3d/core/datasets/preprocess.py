@@ -1,12 +1,24 @@
+import multiprocessing as mp
+import os
 import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from tqdm import tqdm
 
 STOP = {"的","了","是","在","我","你","他","她","它","我们","你们","他们"}
 
+_WS = re.compile(r"\s+")
+# tokens are single characters, so only single-character stopwords can match
+_DROP = re.compile(r"[\s%s]+" % re.escape("".join(sorted(t for t in STOP if len(t) == 1))))
+
 def tokenize_zh(text: str):
     """
     Minimal tokenizer for reproducibility; replace with jieba if needed.
     """
-    text = re.sub(r"\s+", " ", text.strip())
+    text = _WS.sub(" ", text.strip())
     return [c for c in text if c.strip()]
 
 def denoise(tokens):
@@ -15,3 +27,241 @@ def denoise(tokens):
 def semantic_normalize(tokens):
     # Placeholder hook
     return tokens
+
+def clean_text(text: str) -> str:
+    """
+    "".join(semantic_normalize(denoise(tokenize_zh(text)))) as one
+    precompiled regex substitution (no per-character lists).
+    """
+    return _DROP.sub("", text)
+
+def _clean_chunk(texts):
+    return [clean_text(t) for t in texts]
+
+
+def preprocess_stream(rows, chunk_size: int = 1024, batch_size: int = 4096,
+                      workers: int = None, max_pending: int = None, progress: bool = True):
+    """
+    Streaming bulk preprocessing.
+
+    rows: a UGCDataset (streamed via `iter_chunks`) or any iterable of row
+    dicts with `text`. Chunks of `chunk_size` texts are cleaned across a
+    process pool of `workers` (0: in-process) with at most `max_pending`
+    chunks in flight (default 2 * workers), so memory stays flat however
+    large the input. Order is preserved.
+
+    Yields:
+      (rows, texts) batches of `batch_size`, texts ready for
+      FrozenSentenceEncoder. Throughput (rows/s) is shown when `progress`.
+    """
+    if hasattr(rows, "iter_chunks"):
+        chunks = rows.iter_chunks(chunk_size)
+    else:
+        def chunks_of(it):
+            buf = []
+            for r in it:
+                buf.append(r)
+                if len(buf) == chunk_size:
+                    yield buf
+                    buf = []
+            if buf:
+                yield buf
+        chunks = chunks_of(rows)
+
+    bar = tqdm(desc="Preprocessing", unit="row", disable=not progress)
+    out_rows, out_texts = [], []
+
+    def emit(chunk, texts):
+        bar.update(len(chunk))
+        out_rows.extend(chunk)
+        out_texts.extend(texts)
+        while len(out_rows) >= batch_size:
+            batch = (out_rows[:batch_size], out_texts[:batch_size])
+            del out_rows[:batch_size], out_texts[:batch_size]
+            yield batch
+
+    t0 = time.perf_counter()
+    n = 0
+    if workers == 0:
+        for chunk in chunks:
+            n += len(chunk)
+            yield from emit(chunk, _clean_chunk([r["text"] for r in chunk]))
+    else:
+        workers = workers or os.cpu_count() or 1
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"))
+        pending = deque()
+        limit = max_pending or 2 * workers
+        try:
+            for chunk in chunks:
+                pending.append((chunk, pool.submit(_clean_chunk, [r["text"] for r in chunk])))
+                if len(pending) >= limit:
+                    chunk, fut = pending.popleft()
+                    n += len(chunk)
+                    yield from emit(chunk, fut.result())
+            while pending:
+                chunk, fut = pending.popleft()
+                n += len(chunk)
+                yield from emit(chunk, fut.result())
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+    if out_rows:
+        yield out_rows, out_texts
+    bar.close()
+    if progress:
+        dt = time.perf_counter() - t0
+        print(f"[preprocess] {n} rows in {dt:.2f}s ({n / max(dt, 1e-9):.0f} rows/s)")
+
+
+# ---- near-duplicate filtering (MinHash + LSH) ----
+
+_SHINGLE_MUL = np.uint64(0x100000001B3)
+
+
+def _mix64(x):
+    # splitmix64 finalizer (uint64 arithmetic wraps)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _shingle_hashes(texts, k):
+    """
+    32-bit hashes of every character k-shingle (texts shorter than k form
+    one shingle). Returns hashes [S] uint32 and per-text shingle counts [N].
+    """
+    lengths = np.fromiter((len(t) for t in texts), dtype=np.int64, count=len(texts))
+    cp = np.frombuffer("".join(texts).encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+    cp = np.concatenate([cp.astype(np.uint64) + np.uint64(1), np.zeros(k, dtype=np.uint64)])
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    counts = np.maximum(lengths - k + 1, (lengths > 0).astype(np.int64))
+    # shingle start positions: text start + 0 .. count-1
+    pos = np.arange(int(counts.sum()), dtype=np.int64)
+    pos += np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    end_of = np.repeat(ends, counts)
+
+    h = np.zeros(len(pos), dtype=np.uint64)
+    for j in range(k):
+        c = cp[pos + j]
+        if (lengths < k).any():
+            c[pos + j >= end_of] = 0
+        h = h * _SHINGLE_MUL + c
+    return (_mix64(h) >> np.uint64(32)).astype(np.uint32), counts
+
+
+def minhash_signatures(texts, num_perm: int = 128, shingle: int = 3, seed: int = 0,
+                       max_batch: int = 1 << 16):
+    """
+    MinHash signatures over character shingles. Each of the `num_perm`
+    permutations is x -> a * x + b (mod 2**32, odd a) over the mixed shingle
+    hashes; vectorized in batches of at most `max_batch` shingles
+    (memory ~ num_perm * max_batch * 4 bytes).
+    Empty texts get an all-max signature (so they group with each other).
+
+    Returns:
+      sig [N, num_perm] uint32
+    """
+    rng = np.random.RandomState(seed)
+    a = rng.randint(0, 1 << 32, size=(num_perm, 1), dtype=np.uint64).astype(np.uint32) | np.uint32(1)
+    b = rng.randint(0, 1 << 32, size=(num_perm, 1), dtype=np.uint64).astype(np.uint32)
+
+    sig = np.full((len(texts), num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+    i = 0
+    while i < len(texts):
+        # grow the batch until it holds max_batch shingles (at least one text)
+        j, size = i, 0
+        while j < len(texts) and (j == i or size + len(texts[j]) <= max_batch):
+            size += len(texts[j])
+            j += 1
+        h, counts = _shingle_hashes(texts[i:j], shingle)
+        if len(h):
+            perm = a * h[None, :] + b  # [P, S], wraps mod 2**32
+            nz = np.flatnonzero(counts)
+            offs = np.concatenate([[0], np.cumsum(counts[nz])[:-1]])
+            sig[i + nz] = np.minimum.reduceat(perm, offs, axis=1).T
+        i = j
+    return sig
+
+
+def lsh_params(num_perm: int, threshold: float):
+    """
+    (bands, rows) with bands * rows <= num_perm whose S-curve midpoint
+    (1 / bands) ** (1 / rows) is closest to `threshold`.
+    """
+    best = None
+    for r in range(1, num_perm + 1):
+        b = num_perm // r
+        err = abs((1.0 / b) ** (1.0 / r) - threshold)
+        if best is None or err < best[0]:
+            best = (err, b, r)
+    return best[1], best[2]
+
+
+def _connected_components(n, i, j):
+    # min-label propagation with pointer jumping
+    labels = np.arange(n, dtype=np.int64)
+    while True:
+        m = np.minimum(labels[i], labels[j])
+        new = labels.copy()
+        np.minimum.at(new, i, m)
+        np.minimum.at(new, j, m)
+        new = new[new]
+        if np.array_equal(new, labels):
+            return labels
+        labels = new
+
+
+def near_duplicate_groups(sig, threshold: float = 0.8, bands: int = None, rows: int = None):
+    """
+    Group near-duplicates via LSH banding: texts sharing a band bucket are
+    candidates, kept when their estimated Jaccard (signature agreement) is at
+    least `threshold`; groups are the connected components of kept pairs.
+    Each bucket is compared against its first member only, so the cost is
+    linear in the number of texts per band.
+
+    Returns:
+      labels [N] int64 (index of the group's first text)
+    """
+    n, num_perm = sig.shape
+    if bands is None or rows is None:
+        bands, rows = lsh_params(num_perm, threshold)
+    pi, pj = [], []
+    for band in range(bands):
+        key = np.ascontiguousarray(sig[:, band * rows:(band + 1) * rows])
+        _, inv = np.unique(key.view(np.dtype((np.void, key.itemsize * rows))).ravel(),
+                           return_inverse=True)
+        inv = inv.ravel()
+        first = np.full(inv.max() + 1 if n else 0, n, dtype=np.int64)
+        np.minimum.at(first, inv, np.arange(n))
+        leader = first[inv]
+        cand = np.flatnonzero(leader != np.arange(n))
+        pi.append(cand)
+        pj.append(leader[cand])
+    pi = np.concatenate(pi) if pi else np.zeros(0, dtype=np.int64)
+    pj = np.concatenate(pj) if pj else np.zeros(0, dtype=np.int64)
+
+    if len(pi):
+        pair = np.unique(pi * n + pj)
+        pi, pj = pair // n, pair % n
+        ok = (sig[pi] == sig[pj]).mean(axis=1) >= threshold
+        pi, pj = pi[ok], pj[ok]
+    return _connected_components(n, pi, pj)
+
+
+def dedup_near_duplicates(texts, threshold: float = 0.8, num_perm: int = 128,
+                          shingle: int = 3, seed: int = 0):
+    """
+    Collapse near-duplicate texts (reposts, template spam) into weighted
+    representatives.
+
+    Returns:
+      reps [M] int64     index of each group's first text (ascending)
+      weights [M] float  group sizes
+      inverse [N] int64  position in `reps` of each text's group
+    """
+    if len(texts) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0, dtype=np.int64)
+    sig = minhash_signatures(texts, num_perm=num_perm, shingle=shingle, seed=seed)
+    labels = near_duplicate_groups(sig, threshold=threshold)
+    reps, inverse, counts = np.unique(labels, return_inverse=True, return_counts=True)
+    return reps, counts.astype(np.float64), inverse.ravel()
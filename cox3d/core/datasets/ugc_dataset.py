@@ -1,37 +1,259 @@
+import csv
+import io
 import json
+import mmap
 import os
 from datetime import datetime
 from typing import List, Dict, Any
 
+import numpy as np
+
+from core.datasets.columnar import open_columnar_cache
+
 
 def parse_time(ts: str) -> datetime:
     # ISO 8601 with timezone is supported by fromisoformat
     return datetime.fromisoformat(ts)
 
 
+_INDEX_VERSION = 2  # bump when build_line_index output changes
+
+
+def build_line_index(path: str, skip_header: bool = False, quoted: bool = False, block: int = 1 << 24):
+    """
+    Byte offsets of every non-blank line of a text file, found by scanning
+    fixed-size blocks for b"\\n" with NumPy (memory bounded by `block`).
+    Whitespace-only lines are skipped, like `line.strip()` would.
+
+    quoted=True (CSV): a newline inside a double-quoted field does not end
+    the record, so each entry spans one whole CSV record.
+
+    Returns:
+      starts [N] int64, ends [N] int64 (end excludes the newline)
+    """
+    size = os.path.getsize(path)
+    newlines, filled = [], []
+    quotes = 0      # quote characters seen so far (odd = inside a quoted field)
+    pending = False  # the record still open at the block end has content
+    with open(path, "rb") as f:
+        pos = 0
+        while True:
+            buf = f.read(block)
+            if not buf:
+                break
+            b = np.frombuffer(buf, dtype=np.uint8)
+            nl = np.flatnonzero(b == 10)
+            if quoted:
+                q = np.flatnonzero(b == 34)
+                nl = nl[(quotes + np.searchsorted(q, nl)) % 2 == 0]
+                quotes += len(q)
+            # per record: any non-whitespace byte (the tail runs into the next block)
+            cuts = np.concatenate([[0], nl + 1])
+            text = ((b - 9) > 4) & (b != 32)  # not in b" \t\n\v\f\r" (uint8 wraps)
+            seg = np.logical_or.reduceat(text, cuts[cuts < len(b)])
+            seg[0] |= pending
+            filled.append(seg[:len(nl)])
+            pending = len(seg) > len(nl) and bool(seg[-1])
+            newlines.append(nl + pos)
+            pos += len(buf)
+    nl = np.concatenate(newlines).astype(np.int64) if newlines else np.zeros(0, dtype=np.int64)
+    keep = np.concatenate(filled) if filled else np.zeros(0, dtype=bool)
+
+    starts = np.concatenate([[0], nl + 1]).astype(np.int64)[:len(nl)]
+    ends = nl
+    if len(nl) == 0 or nl[-1] != size - 1:
+        # last record without a trailing newline
+        starts = np.append(starts, nl[-1] + 1 if len(nl) else 0)
+        ends = np.append(ends, size)
+        keep = np.append(keep, pending)
+    starts, ends = starts[keep], ends[keep]
+    if skip_header:
+        starts, ends = starts[1:], ends[1:]
+    return starts, ends
+
+
+def load_line_index(path: str, index_path: str, skip_header: bool = False, quoted: bool = False):
+    """
+    Load the cached line index of `path`, rebuilding it when the source file's
+    size or mtime changed (or the cache is missing/unreadable/outdated).
+    """
+    st = os.stat(path)
+    try:
+        with np.load(index_path) as z:
+            if (int(z["version"]) == _INDEX_VERSION and int(z["size"]) == st.st_size
+                    and int(z["mtime_ns"]) == st.st_mtime_ns):
+                return z["starts"], z["ends"]
+    except (OSError, KeyError, ValueError):
+        pass
+
+    starts, ends = build_line_index(path, skip_header=skip_header, quoted=quoted)
+    try:
+        with open(index_path, "wb") as f:
+            np.savez(f, starts=starts, ends=ends, size=st.st_size, mtime_ns=st.st_mtime_ns,
+                     version=_INDEX_VERSION)
+    except OSError:
+        pass  # read-only location: keep the in-memory index
+    return starts, ends
+
+
 class UGCDataset:
     """
     CoX-3D Dataset: {text, image(optional), timestamp}
     This is the *constructed* dataset artifact (Algorithm 1 output).
+
+    Input is JSONL, or a CSV with a header (`text` or `prompt` column,
+    optional `timestamp` / `image_path`), e.g. sample_data/ugc_prompts.csv.
+
+    lazy=True: instead of parsing every row up front, build (and cache next to
+    the source, `<path>.idx.npz`) a byte-offset index of the non-blank records
+    (CSV records by csv quoting rules), memory-map the file and
+    parse rows on __getitem__. Use `iter_chunks` to stream rows, optionally
+    sharded across worker processes (the dataset is picklable).
+
+    columnar=True: convert the source once into a columnar cache
+    (`<path>.cols/`, see core.datasets.columnar) and memory-map it; the cache
+    is rebuilt automatically when the source's size/mtime/sha1 changes.
+    Timestamps are int64 epoch columns, so `time_range` is vectorized.
     """
 
-    def __init__(self, path_jsonl: str, image_root: str):
+    def __init__(
+        self,
+        path_jsonl: str,
+        image_root: str,
+        lazy: bool = False,
+        index_path: str = None,
+        columnar: bool = False,
+        cache_dir: str = None,
+    ):
         self.path_jsonl = path_jsonl
         self.image_root = image_root
+        self.lazy = bool(lazy)
+        self.columnar = bool(columnar)
+        self.is_csv = path_jsonl.lower().endswith(".csv")
         self.items: List[Dict[str, Any]] = []
+        self._mm = None
+        self.table = None
+
+        if self.is_csv:
+            with open(path_jsonl, "r", encoding="utf-8", newline="") as f:
+                self.fieldnames = next(csv.reader(f))
+
+        if self.columnar:
+            self.cache_dir = cache_dir or path_jsonl + ".cols"
+            self.table = open_columnar_cache(
+                path_jsonl, self.cache_dir, lambda: map(self._parse, self._iter_raw())
+            )
+            return
+
+        if self.lazy:
+            self.index_path = index_path or path_jsonl + ".idx.npz"
+            self.starts, self.ends = load_line_index(
+                path_jsonl, self.index_path, skip_header=self.is_csv, quoted=self.is_csv
+            )
+            return
+
+        for obj in self._iter_raw():
+            self.items.append(self._normalize(obj))
+
+    def _iter_raw(self):
+        with open(self.path_jsonl, "r", encoding="utf-8", newline="" if self.is_csv else None) as f:
+            if self.is_csv:
+                yield from csv.DictReader(f)
+            else:
+                yield from (json.loads(line) for line in f if line.strip())
 
-        with open(path_jsonl, "r", encoding="utf-8") as f:
-            for line in f:
-                obj = json.loads(line)
-                obj["timestamp"] = parse_time(obj["timestamp"])
-                # normalize image path
-                imgp = obj.get("image_path", "")
-                if imgp:
-                    obj["image_path"] = os.path.join(image_root, imgp)
-                self.items.append(obj)
+    @staticmethod
+    def _parse(obj: Dict[str, Any]):
+        if "text" not in obj and "prompt" in obj:
+            obj["text"] = obj["prompt"]
+        ts = obj.get("timestamp")
+        obj["timestamp"] = parse_time(ts) if ts else None
+        return obj
+
+    def _normalize(self, obj: Dict[str, Any]):
+        obj = self._parse(obj)
+        # normalize image path
+        imgp = obj.get("image_path", "")
+        if imgp:
+            obj["image_path"] = os.path.join(self.image_root, imgp)
+        return obj
+
+    def _row(self, idx: int):
+        if self._mm is None:
+            with open(self.path_jsonl, "rb") as f:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        raw = self._mm[self.starts[idx]:self.ends[idx]]
+        if self.is_csv:
+            values = next(csv.reader(io.StringIO(raw.decode("utf-8"))))
+            return dict(zip(self.fieldnames, values))
+        return json.loads(raw)
+
+    def _column_rows(self, start: int, stop: int):
+        # one slice per column; JSON is only decoded for rows with extra fields
+        t = self.table
+        rows = []
+        for text, ts, imgp, extra in zip(
+            t.text.slice(start, stop), t.timestamps(start, stop),
+            t.image_path.slice(start, stop), t.extra.slice(start, stop),
+        ):
+            obj = json.loads(extra) if extra else {}
+            obj["text"] = text
+            obj["timestamp"] = ts
+            obj["image_path"] = os.path.join(self.image_root, imgp) if imgp else imgp
+            rows.append(obj)
+        return rows
 
     def __len__(self):
-        return len(self.items)
+        if self.columnar:
+            return len(self.table)
+        return len(self.starts) if self.lazy else len(self.items)
 
     def __getitem__(self, idx: int):
-        return self.items[idx]
+        if not (self.lazy or self.columnar):
+            return self.items[idx]
+        n = len(self)
+        if idx < 0:
+            idx += n
+        if not 0 <= idx < n:
+            raise IndexError(idx)
+        if self.columnar:
+            return self._column_rows(idx, idx + 1)[0]
+        return self._normalize(self._row(idx))
+
+    def time_range(self, start: datetime = None, end: datetime = None):
+        """
+        Indices of rows with start <= timestamp < end (either bound optional).
+        Vectorized over the epoch column in columnar mode.
+        """
+        if self.columnar:
+            return self.table.time_range(start, end)
+        keep = []
+        for i in range(len(self)):
+            ts = self[i]["timestamp"]
+            if ts is None or (start is not None and ts < start) or (end is not None and ts >= end):
+                continue
+            keep.append(i)
+        return np.asarray(keep, dtype=np.int64)
+
+    def shard_range(self, shard: int = 0, num_shards: int = 1):
+        """
+        Contiguous [start, stop) row range handled by `shard` out of `num_shards`.
+        """
+        n = len(self)
+        return n * shard // num_shards, n * (shard + 1) // num_shards
+
+    def iter_chunks(self, chunk_size: int = 1024, shard: int = 0, num_shards: int = 1):
+        """
+        Yield lists of at most `chunk_size` parsed rows from this shard's range.
+        """
+        start, stop = self.shard_range(shard, num_shards)
+        for s in range(start, stop, chunk_size):
+            if self.columnar:
+                yield self._column_rows(s, min(s + chunk_size, stop))
+            else:
+                yield [self[i] for i in range(s, min(s + chunk_size, stop))]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_mm"] = None  # re-opened lazily in the worker
+        return state
@@ -0,0 +1,316 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from core.engine.mesh import Mesh
+
+_CORE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_STEM = "__cox3d_asset__"
+
+# files that name their siblings; only their header is rewritten on restore
+_HEADER_END = {".obj": b"\nv ", ".mtl": None, ".ply": b"end_header\n"}
+
+_versions = {}
+
+_EVICT_TO = 0.9  # of max_bytes, so a full cache does not rescan on every put
+
+
+def code_version(*packages):
+    """
+    Hash of the sources of the given core sub-packages (e.g. "generation")
+    or single modules (e.g. "engine/mesh.py"), so cached results are
+    invalidated when that code changes.
+    """
+    if packages not in _versions:
+        h = hashlib.blake2b(digest_size=8)
+        for pkg in packages:
+            if pkg.endswith(".py"):
+                paths = [os.path.join(_CORE, pkg)]
+            else:
+                paths = sorted(glob.glob(os.path.join(_CORE, pkg, "**", "*.py"), recursive=True))
+            for path in paths:
+                h.update(os.path.relpath(path, _CORE).encode("utf-8"))
+                with open(path, "rb") as f:
+                    h.update(f.read())
+        _versions[packages] = h.hexdigest()
+    return _versions[packages]
+
+
+def cache_key(**params):
+    """
+    Content address of a set of (JSON-serializable) parameters.
+    """
+    blob = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(blob.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def _relink(src, dst, old, new, end):
+    """
+    Copy `src` to `dst`, replacing `old` by `new` in the header only (up to
+    `end`, or the whole file when `end` is None).
+    """
+    with open(src, "rb") as fi, open(dst, "wb") as fo:
+        head = fi.read(1 << 16)
+        cut = len(head) if end is None else head.find(end)
+        cut = len(head) if cut < 0 else cut
+        fo.write(head[:cut].replace(old, new))
+        fo.write(head[cut:])
+        shutil.copyfileobj(fi, fo, 1 << 20)
+
+
+class AssetCache:
+    """
+    Content-addressed cache of generated meshes and exported assets.
+
+    Each entry is a directory `<root>/<key[:2]>/<key>/` holding either
+    `arrays.npz` (a generated mesh, a UV parametrization, ...) or the
+    exported files (stored under a neutral stem and renamed on restore), plus
+    `meta.json` with its kind, file sizes and last use. Total size is bounded
+    by `max_bytes`, evicting the least recently used entries. Sizes and LRU
+    order are tracked in memory (one scan of the root on first use); the
+    root is rescanned only when that total exceeds the budget (which also
+    picks up entries written by other processes), then trimmed to 90% of it.
+
+    link=True: restored files are hardlinks to the cache (falls back to a
+    copy across filesystems); do not edit them in place, or set link=False.
+    Files that reference siblings (.obj/.mtl/.ply) are always copied.
+
+    Safe to share between threads (operations hold a lock) and processes on
+    one root: an entry evicted or replaced while it is read counts as a miss.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 20 << 30, link: bool = True):
+        self.root = root
+        self.max_bytes = int(max_bytes)
+        self.link = bool(link)
+        os.makedirs(root, exist_ok=True)
+        self.hits = {"mesh": 0, "uv": 0, "assets": 0}
+        self.misses = {"mesh": 0, "uv": 0, "assets": 0}
+        self.evictions = 0
+        self._lock = threading.RLock()
+        self._index = None  # key -> size, least recently used first
+        self._bytes = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]  # re-created in the worker
+        state["_index"] = None  # rescanned in the worker
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def _dir(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def _meta(self, key):
+        try:
+            with open(os.path.join(self._dir(key), "meta.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _touch(self, key, meta):
+        meta["last_used"] = time.time()
+        tmp = os.path.join(self._dir(key), "meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp, os.path.join(self._dir(key), "meta.json"))
+
+    def _valid(self, key, meta):
+        # cheap check that no cached file was truncated / edited through a link
+        d = self._dir(key)
+        try:
+            return all(os.path.getsize(os.path.join(d, fn)) == size for fn, size in meta["files"].items())
+        except OSError:
+            return False
+
+    def _lookup(self, key, kind):
+        meta = self._meta(key)
+        if meta is None or meta.get("kind") != kind or not self._valid(key, meta):
+            if meta is not None:
+                shutil.rmtree(self._dir(key), ignore_errors=True)
+                self._account(key)
+            return None
+        self._touch(key, meta)
+        self._account(key, meta["size"])
+        return meta
+
+    def _count(self, kind, hit):
+        (self.hits if hit else self.misses)[kind] += 1
+
+    def _scan(self):
+        entries = sorted(self._entries(), key=lambda e: e[1]["last_used"])
+        self._index = OrderedDict((key, meta["size"]) for key, meta in entries)
+        self._bytes = sum(self._index.values())
+
+    def _account(self, key, size=None):
+        # in-memory LRU: drop `key`, then re-add it as most recent unless size is None
+        if self._index is None:
+            self._scan()
+        self._bytes -= self._index.pop(key, 0)
+        if size is not None:
+            self._index[key] = size
+            self._bytes += size
+
+    def _commit(self, key, kind, tmp_dir, **extra):
+        files = {fn: os.path.getsize(os.path.join(tmp_dir, fn)) for fn in os.listdir(tmp_dir)}
+        meta = dict(kind=kind, files=files, size=sum(files.values()), created=time.time(), **extra)
+        meta["last_used"] = meta["created"]
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        d = self._dir(key)
+        shutil.rmtree(d, ignore_errors=True)
+        os.makedirs(os.path.dirname(d), exist_ok=True)
+        try:
+            os.replace(tmp_dir, d)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)  # another process committed this key first
+        self._account(key, meta["size"])
+        if self._bytes > self.max_bytes:
+            self.evict(int(self.max_bytes * _EVICT_TO))
+
+    def _tmp_dir(self, key):
+        d = os.path.join(self.root, f".tmp-{key}-{os.getpid()}")
+        shutil.rmtree(d, ignore_errors=True)
+        os.makedirs(d)
+        return d
+
+    def get_arrays(self, key, kind):
+        """
+        {name: array} stored by `put_arrays` under `kind`, or None on a miss.
+        """
+        with self._lock:
+            arrays = None
+            try:
+                meta = self._lookup(key, kind)
+                if meta is not None:
+                    fn = next(f for f in meta["files"] if f.endswith(".npz"))  # "mesh.npz" in older caches
+                    with np.load(os.path.join(self._dir(key), fn)) as z:
+                        arrays = {k: z[k] for k in z.files}
+            except (OSError, ValueError):
+                arrays = None  # evicted / replaced meanwhile
+            self._count(kind, arrays is not None)
+            return arrays
+
+    def put_arrays(self, key, kind, arrays):
+        with self._lock:
+            tmp = self._tmp_dir(key)
+            np.savez(os.path.join(tmp, "arrays.npz"), **arrays)
+            self._commit(key, kind, tmp)
+
+    def get_mesh(self, key):
+        arrays = self.get_arrays(key, "mesh")
+        return None if arrays is None else Mesh(**arrays)
+
+    def put_mesh(self, key, mesh):
+        self.put_arrays(key, "mesh", mesh.arrays())
+
+    def put_assets(self, key, src_dir: str, name: str, paths):
+        """
+        Store every file exported into `src_dir` (all named `<name>...`);
+        `paths` are the primary outputs returned by `restore_assets`.
+        """
+        with self._lock:
+            tmp = self._tmp_dir(key)
+            for fn in os.listdir(src_dir):
+                src = os.path.join(src_dir, fn)
+                dst = os.path.join(tmp, fn.replace(name, _STEM, 1))
+                ext = os.path.splitext(fn)[1].lower()
+                if ext in _HEADER_END:
+                    _relink(src, dst, name.encode("utf-8"), _STEM.encode("utf-8"), _HEADER_END[ext])
+                elif self.link:
+                    _link_or_copy(src, dst)
+                else:
+                    shutil.copyfile(src, dst)
+            names = [os.path.basename(p).replace(name, _STEM, 1) for p in paths]
+            self._commit(key, "assets", tmp, names=names)
+
+    def restore_assets(self, key, out_dir: str, name: str):
+        """
+        Materialize cached assets as `out_dir/<name>...`. Returns the restored
+        paths in the order they were stored, or None on a miss.
+        """
+        with self._lock:
+            try:
+                paths = self._restore(key, out_dir, name)
+            except OSError:
+                paths = None  # evicted / replaced meanwhile; the caller re-exports
+            self._count("assets", paths is not None)
+            return paths
+
+    def _restore(self, key, out_dir, name):
+        meta = self._lookup(key, "assets")
+        if meta is None:
+            return None
+        os.makedirs(out_dir, exist_ok=True)
+        d = self._dir(key)
+        for fn in meta["files"]:
+            dst = os.path.join(out_dir, fn.replace(_STEM, name, 1))
+            if os.path.exists(dst) and os.path.samefile(dst, os.path.join(d, fn)):
+                continue  # already linked (rename between two links of one file is a no-op)
+            tmp = dst + ".tmp"
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            ext = os.path.splitext(fn)[1].lower()
+            if ext in _HEADER_END:
+                _relink(os.path.join(d, fn), tmp, _STEM.encode("utf-8"), name.encode("utf-8"), _HEADER_END[ext])
+            elif self.link:
+                _link_or_copy(os.path.join(d, fn), tmp)
+            else:
+                shutil.copyfile(os.path.join(d, fn), tmp)
+            # replace (never truncate) so an existing hardlink is not written through
+            os.replace(tmp, dst)
+        return [os.path.join(out_dir, n.replace(_STEM, name, 1)) for n in meta["names"]]
+
+    def _entries(self):
+        for meta_path in glob.glob(os.path.join(self.root, "??", "*", "meta.json")):
+            key = os.path.basename(os.path.dirname(meta_path))
+            meta = self._meta(key)
+            if meta is not None:
+                yield key, meta
+
+    def evict(self, max_bytes: int = None):
+        """
+        Rescan the root and drop least recently used entries until the cache
+        fits in `max_bytes` (default: the cache's budget).
+        """
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        with self._lock:
+            self._scan()
+            for key in list(self._index):
+                if self._bytes <= limit:
+                    break
+                shutil.rmtree(self._dir(key), ignore_errors=True)
+                self._account(key)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            entries = list(self._entries())
+            hits, misses = dict(self.hits), dict(self.misses)
+        lookups = sum(hits.values()) + sum(misses.values())
+        return {
+            "entries": len(entries),
+            "bytes": sum(m["size"] for _, m in entries),
+            "max_bytes": self.max_bytes,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": sum(hits.values()) / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,227 @@
+import multiprocessing as mp
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from core.engine import trace
+from core.engine.asset_cache import AssetCache
+from core.engine.mesh import Mesh
+
+_DONE = object()
+
+
+def postprocess_mesh(mesh, out_dir, name, opts):
+    """
+    Weld + decimate, UV unwrap, bake and export of one `Mesh`; runs in a
+    worker process (a shared mesh is mapped, not copied, and unmapped when
+    done). opts: weld_tol, decimate_faces,
+    decimate_ratio, decimate_max_error, tex_res, gutter, tile_size,
+    png_compress_level, png_async, export_formats, quantize, uv_options,
+    uv_cache (AssetCache arguments for cached unwraps, or None), trace_dir
+    (None: tracing off).
+    """
+    if opts.get("trace_dir"):
+        trace.enable(opts["trace_dir"], role="postprocess")
+    try:
+        with trace.span(
+            "postprocess", "postprocess", sample=name,
+            verts=len(mesh.verts), faces=len(mesh.faces),
+        ):
+            return _postprocess_mesh(mesh, out_dir, name, opts)
+    finally:
+        mesh.release()
+        trace.flush()
+
+
+def _postprocess_mesh(mesh, out_dir, name, opts):
+    from core.postprocess.simplify import decimate_qem, weld_vertices
+    from core.postprocess.uv_unwrap import unwrap_uv_xatlas
+    from core.postprocess.bake_texture import bake_vertex_colors_to_texture
+
+    verts, faces, vcolors = mesh.verts, mesh.faces, mesh.vcolors
+
+    # Weld + QEM decimation (unwrap / bake / file size scale with face count)
+    if opts["weld_tol"]:
+        verts, faces, vcolors = weld_vertices(verts, faces, vcolors, tol=opts["weld_tol"])
+    target = opts["decimate_faces"]
+    if opts["decimate_ratio"]:
+        target = max(target or 0, int(len(faces) * opts["decimate_ratio"]))
+    if target or opts["decimate_max_error"]:
+        verts, faces, vcolors = decimate_qem(
+            verts, faces, vcolors, target_faces=target, max_error=opts["decimate_max_error"],
+        )
+
+    # UV unwrap (reused from the cache when this geometry was unwrapped before);
+    # seam vertices are gathered lazily from the welded buffers via vmapping
+    cache = AssetCache(**opts["uv_cache"]) if opts["uv_cache"] else None
+    _, new_faces, uvs, vmapping = unwrap_uv_xatlas(verts, faces, options=opts["uv_options"], cache=cache)
+    out = Mesh(verts, faces, vcolors).unwrapped(new_faces, uvs, vmapping)
+
+    # Bake vertex colors -> UV texture (tiled bakes live in a temp memmap, removed
+    # even when baking or an exporter fails: several GB at 8K/16K)
+    work_dir = tempfile.mkdtemp(prefix="cox3d_bake_") if opts["tile_size"] else None
+    tex = None
+    try:
+        tex = bake_vertex_colors_to_texture(
+            out.verts, out.faces, out.vcolors, out.uvs,
+            tex_res=opts["tex_res"], gutter=opts["gutter"],
+            tile_size=opts["tile_size"], work_dir=work_dir,
+        )
+        return _export(out, tex, out_dir, name, opts)
+    finally:
+        if work_dir is not None:
+            del tex
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _export(out, tex, out_dir, name, opts):
+    from core.postprocess.export_obj import export_obj_mtl_png
+    from core.postprocess.export_glb import export_glb
+    from core.postprocess.export_ply import export_ply
+
+    # the albedo PNG is encoded once: later exporters reuse the first one written
+    paths, png = [], None
+    if "obj" in opts["export_formats"]:
+        paths.append(export_obj_mtl_png(
+            out_dir=out_dir,
+            name=name,
+            verts=out.verts,
+            faces=out.faces,
+            uvs=out.uvs,
+            texture=tex,
+            png_compress_level=opts["png_compress_level"],
+            png_async=opts["png_async"],
+        ))
+        png = os.path.join(out_dir, f"{name}_albedo.png")
+    if "ply" in opts["export_formats"]:
+        ply = export_ply(
+            out_dir, name, out.verts, out.faces, out.uvs, tex,
+            png_compress_level=opts["png_compress_level"], tex_path=png,
+        )
+        png = os.path.join(out_dir, f"{name}_albedo.png")
+    if "glb" in opts["export_formats"]:
+        paths.append(export_glb(
+            out_dir, name, out.verts, out.faces, out.uvs, tex,
+            quantize=opts["quantize"], png_compress_level=opts["png_compress_level"], tex_path=png,
+        ))
+    if "ply" in opts["export_formats"]:
+        paths.append(ply)
+    return paths
+
+
+def _timed_call(job, *args):
+    t0 = time.perf_counter()
+    out = job(*args)
+    return out, time.perf_counter() - t0
+
+
+def _format_error(e):
+    return "".join(traceback.format_exception_only(type(e), e)).strip()
+
+
+def run_staged(produce, job, workers=2, queue_size=4):
+    """
+    Two-stage executor: `produce()` (e.g. GPU generation) runs in a thread
+    and yields (key, args, error) items into a queue of at most `queue_size`
+    entries; `job(*args)` (CPU postprocessing) runs in a process pool of
+    `workers` (0: in this thread, still overlapping with the producer).
+
+    Back-pressure: at most `workers` jobs are in flight and the producer
+    blocks while the queue is full. Errors are isolated per item: a failed
+    item (error set by the producer, or raised by its job) is reported and
+    the rest continue. If a worker process dies, the pool is rebuilt and the
+    items it was running are re-run one at a time, so only the item that
+    crashes on its own is reported as failed.
+
+    Yields:
+      (key, result, error, seconds) in completion order; error is None or a
+      message, seconds is the job's own run time (None if it did not finish).
+    """
+    q = queue.Queue(maxsize=max(1, int(queue_size)))
+    stop = threading.Event()
+
+    def producer():
+        try:
+            for item in produce():
+                while not stop.is_set():
+                    try:
+                        q.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+        except BaseException as e:  # surface in the consumer
+            q.put((_DONE, None, e))
+            return
+        q.put((_DONE, None, None))
+
+    def new_pool():
+        return ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"))
+
+    thread = threading.Thread(target=producer, name="cox3d-producer", daemon=True)
+    pool = new_pool() if workers else None
+    thread.start()
+    running = {}          # future -> (key, args, solo, pool)
+    quarantine = deque()  # items caught in a worker crash, re-run one at a time
+    try:
+        done = False
+        while not done or running or quarantine:
+            for fut in [f for f in running if f.done()]:
+                key, args, solo, owner = running.pop(fut)
+                e = fut.exception()
+                if isinstance(e, BrokenProcessPool):
+                    # a worker died (e.g. native crash in xatlas)
+                    if owner is pool:
+                        pool.shutdown(wait=False, cancel_futures=True)
+                        pool = new_pool()
+                    if not solo:
+                        quarantine.append((key, args))
+                        continue
+                if e is not None:
+                    yield key, None, _format_error(e), None
+                else:
+                    out, dt = fut.result()
+                    yield key, out, None, dt
+
+            if quarantine:
+                if not running:
+                    key, args = quarantine.popleft()
+                    running[pool.submit(_timed_call, job, *args)] = (key, args, True, pool)
+                else:
+                    wait(running, timeout=0.5, return_when=FIRST_COMPLETED)
+            # take new work only while a worker slot is free
+            elif not done and len(running) < max(1, workers):
+                try:
+                    key, args, err = q.get(timeout=0.05)
+                except queue.Empty:
+                    continue
+                if key is _DONE:
+                    if err is not None:
+                        raise err
+                    done = True
+                elif err is not None:
+                    yield key, None, err, None
+                elif pool is None:
+                    try:
+                        out, dt = _timed_call(job, *args)
+                    except Exception as e:
+                        yield key, None, _format_error(e), None
+                    else:
+                        yield key, out, None, dt
+                else:
+                    running[pool.submit(_timed_call, job, *args)] = (key, args, False, pool)
+            elif running:
+                wait(running, timeout=0.5, return_when=FIRST_COMPLETED)
+    finally:
+        stop.set()
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        thread.join(timeout=1.0)
@@ -0,0 +1,165 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+_ALIGN = 64  # byte alignment of each buffer inside a shared block
+_BUFFERS = ("verts", "faces", "vcolors", "uvs")
+_unclosed = []  # shared blocks whose arrays outlived their mesh
+
+
+def index_dtype(num_verts: int):
+    """
+    Smallest index type able to address num_verts vertices.
+    """
+    return np.uint16 if num_verts <= 0xFFFF else np.uint32
+
+
+class GatheredView:
+    """
+    Rows `base[index]` gathered on access instead of up front, e.g. the
+    per-vertex attributes of an unwrapped mesh (`index` = xatlas vmapping).
+    Indexing with a slice or an index array gathers only those rows;
+    `np.asarray(view)` materializes the whole array.
+    """
+
+    __slots__ = ("base", "index")
+
+    def __init__(self, base, index):
+        self.base, self.index = base, index
+
+    @property
+    def shape(self):
+        return (len(self.index),) + self.base.shape[1:]
+
+    @property
+    def dtype(self):
+        return self.base.dtype
+
+    @property
+    def ndim(self):
+        return self.base.ndim
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            return self.base[(self.index[key[0]],) + key[1:]]
+        return self.base[self.index[key]]
+
+    def __array__(self, dtype=None, copy=None):
+        out = self.base[self.index]
+        return out if dtype is None else out.astype(dtype, copy=False)
+
+
+def _buffer(a, dtype):
+    return a if isinstance(a, GatheredView) else np.ascontiguousarray(a, dtype=dtype)
+
+
+def _from_block(shm, layout):
+    mesh = Mesh.__new__(Mesh)
+    for slot in _BUFFERS:
+        setattr(mesh, slot, None)
+    for slot, dtype, shape, offset in layout:
+        arr = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+        arr.flags.writeable = False  # shared with the owner and other workers
+        setattr(mesh, slot, arr)
+    mesh._shm, mesh._layout = shm, layout
+    return mesh
+
+
+def _attach(name, layout):
+    return _from_block(shared_memory.SharedMemory(name=name), layout)
+
+
+class Mesh:
+    """
+    Triangle mesh passed between generation, postprocessing and the caches.
+
+    Buffers are C-contiguous with fixed types: verts [V,3] float32, faces
+    [F,3] uint16/uint32 (the smallest type addressing V vertices), vcolors
+    [V,C] uint8 and, once unwrapped, uvs [V,2] float32. Arrays already in
+    that form are kept without copying. verts / vcolors may also be
+    `GatheredView`s, so unwrapping does not duplicate them per seam vertex.
+
+    `share()` moves the buffers into one shared-memory block; such a mesh
+    pickles to its block name and layout, so worker processes map the same
+    memory instead of receiving a copy.
+    """
+
+    __slots__ = _BUFFERS + ("_shm", "_layout")
+
+    def __init__(self, verts, faces, vcolors=None, uvs=None):
+        self.verts = _buffer(verts, np.float32)
+        self.faces = np.ascontiguousarray(faces, dtype=index_dtype(len(self.verts)))
+        self.vcolors = None if vcolors is None else _buffer(vcolors, np.uint8)
+        self.uvs = None if uvs is None else np.ascontiguousarray(uvs, dtype=np.float32)
+        self._shm = self._layout = None
+
+    @classmethod
+    def from_dict(cls, d):
+        """
+        Mesh from a {verts, faces, vcolors[, uvs]} dict (the generator output).
+        """
+        return cls(d["verts"], d["faces"], d.get("vcolors"), d.get("uvs"))
+
+    def arrays(self):
+        """
+        {name: array} of the set buffers (views materialized), e.g. for np.savez.
+        """
+        return {
+            slot: np.asarray(getattr(self, slot))
+            for slot in _BUFFERS if getattr(self, slot) is not None
+        }
+
+    def unwrapped(self, faces, uvs, vmapping):
+        """
+        Mesh re-indexed by a UV unwrap: new vertex i is old vertex vmapping[i].
+        """
+        return Mesh(
+            GatheredView(self.verts, vmapping), faces,
+            None if self.vcolors is None else GatheredView(self.vcolors, vmapping), uvs,
+        )
+
+    def share(self):
+        """
+        Copy of this mesh in a new shared-memory block. The caller owns the
+        block and must `release(unlink=True)` it once no worker needs it.
+        """
+        arrays = self.arrays()
+        layout, size = [], 0
+        for slot, a in arrays.items():
+            size = -(-size // _ALIGN) * _ALIGN
+            layout.append((slot, a.dtype.str, a.shape, size))
+            size += a.nbytes
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for slot, dtype, shape, offset in layout:
+            np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)[...] = arrays[slot]
+        return _from_block(shm, layout)
+
+    def release(self, unlink=False):
+        """
+        Drop the buffers and unmap the shared block (no-op for a private
+        mesh); unlink=True also frees the block once every process has
+        released it.
+        """
+        shm = self._shm
+        if shm is None:
+            return
+        for slot in _BUFFERS:
+            setattr(self, slot, None)
+        self._shm = self._layout = None
+        if unlink:
+            shm.unlink()
+        _unclosed.append(shm)
+        for shm in list(_unclosed):
+            try:
+                shm.close()
+            except BufferError:
+                continue  # arrays still referenced (e.g. by a traceback); retried next time
+            _unclosed.remove(shm)
+
+    def __reduce__(self):
+        if self._shm is None:
+            return Mesh, (self.verts, self.faces, self.vcolors, self.uvs)
+        return _attach, (self._shm.name, self._layout)
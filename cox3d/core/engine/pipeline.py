@@ -1,15 +1,17 @@
+import glob
+import json
 import os
+import shutil
+import tempfile
+import time
+from functools import cached_property
 
-from core.datasets.ugc_dataset import UGCDataset
-from core.semantics.bertopic_llm import ELLM
-from core.semantics.text_encoder import FrozenSentenceEncoder
-from core.semantics.shap_mapper import SHAPMapper
-from core.alignment.clip_alignment import CLIPAligner
+from core.engine import trace
+from core.engine.asset_cache import AssetCache, cache_key, code_version
+from core.engine.executor import postprocess_mesh, run_staged
+from core.engine.mesh import Mesh
 
-from core.generation.instantiations.shapee_text2mesh import ShapeEText2Mesh
-from core.postprocess.uv_unwrap import unwrap_uv_xatlas
-from core.postprocess.bake_texture import bake_vertex_colors_to_texture
-from core.postprocess.export_obj import export_obj_mtl_png
+STAGES = ("semantic", "generation", "postprocess")
 
 
 class CoX3DPipeline:
@@ -17,86 +19,568 @@ class CoX3DPipeline:
     End-to-end pipeline aligned with:
     - Algorithm 1: dataset construction (here uses JSONL as the constructed dataset)
     - Algorithm 2: ELLM -> alignment -> generation -> postprocess -> export
+
+    Stages are built on first use (heavy imports such as torch, sklearn,
+    Shap-E, CLIP and xatlas are deferred into them), so constructing the
+    pipeline is cheap and only the selected `stages` pay their setup cost;
+    `timings` records how long each stage took to build.
+
+    stages: contiguous subset of ("semantic", "generation", "postprocess")
+    (e.g. not semantic + postprocess, which needs generation). Without
+    "semantic", prompts are read from `<out_dir>/<export_name>_prompts.json`
+    (written by a semantic-only run); without "postprocess", meshes are saved
+    to `postprocess.mesh_dir` (default `<out_dir>/meshes`) as .npz, and a
+    postprocess-only run exports every mesh found there.
     """
 
-    def __init__(self, cfg: dict):
+    def __init__(self, cfg: dict, stages=None):
         self.cfg = cfg
         self.device = cfg.get("device", "cuda")
+        self.stages = tuple(stages or cfg.get("stages") or STAGES)
+        for stage in self.stages:
+            if stage not in STAGES:
+                raise ValueError(f"Unknown stage: {stage}")
+        # stages hand off through files only at their boundaries, so no gaps
+        picked = [i for i, stage in enumerate(STAGES) if stage in self.stages]
+        if picked != list(range(picked[0], picked[-1] + 1)):
+            raise ValueError(f"Stages must be contiguous in {STAGES}, got {self.stages}")
+        self.timings = {}
+        self._torch_seeded = False
 
-        # Dataset
-        self.ds = UGCDataset(
-            path_jsonl=cfg["dataset"]["path_jsonl"],
-            image_root=cfg["dataset"]["image_root"],
-        )
+        self.dedup = cfg["semantic"].get("dedup", False)
+        self.dedup_threshold = cfg["semantic"].get("dedup_threshold", 0.8)
+        self.dedup_num_perm = cfg["semantic"].get("dedup_num_perm", 128)
 
-        # Stage I: ELLM semantic modeling
-        self.text_encoder = FrozenSentenceEncoder(device=self.device)
-        self.ellm = ELLM(
-            text_encoder=self.text_encoder,
-            topic_k=cfg["semantic"]["topic_k"],
-            use_bertopic=cfg["semantic"]["use_bertopic"],
-            llm_filter=cfg["semantic"]["llm_filter"],
-            lambda_kl=cfg["semantic"]["lambda_kl"],
-            device=self.device,
-        )
-        self.shap_mapper = SHAPMapper(num_factors=cfg["semantic"]["topic_k"])
-
-        # Stage II: CLIP alignment (optional)
-        self.clip = CLIPAligner(device=self.device)
-
-        # Stage III-IV: Generation (minimal runnable instantiation)
         impl = cfg["generation"]["impl"]
-        if impl == "shapee":
-            self.generator = ShapeEText2Mesh(
-                device=self.device,
-                steps=cfg["generation"]["shapee_steps"],
-                guidance_scale=cfg["generation"]["guidance_scale"],
-            )
-        else:
+        if impl not in ("shapee",):
             raise ValueError(f"Unknown generation impl: {impl}")
 
         # Postprocess configs
+        self.weld_tol = cfg["postprocess"].get("weld_tol")
+        self.decimate_faces = cfg["postprocess"].get("decimate_faces")
+        self.decimate_ratio = cfg["postprocess"].get("decimate_ratio")
+        self.decimate_max_error = cfg["postprocess"].get("decimate_max_error")
+        self.uv_options = {
+            k: cfg["postprocess"].get(f"uv_{k}")
+            for k in ("resolution", "padding", "brute_force", "max_iterations")
+            if cfg["postprocess"].get(f"uv_{k}") is not None
+        }
         self.tex_res = cfg["postprocess"]["tex_res"]
+        self.gutter = cfg["postprocess"].get("gutter")
+        self.tile_size = cfg["postprocess"].get("tile_size")
+        self.png_compress_level = cfg["postprocess"].get("png_compress_level")
+        self.png_async = cfg["postprocess"].get("png_async", False)
+        fmt = cfg["postprocess"].get("export_format", "obj")
+        self.export_formats = [fmt] if isinstance(fmt, str) else list(fmt)
+        for fmt in self.export_formats:
+            if fmt not in ("obj", "glb", "ply"):
+                raise ValueError(f"Unknown export format: {fmt}")
+        self.quantize = cfg["postprocess"].get("quantize", False)
         self.out_dir = cfg["postprocess"]["out_dir"]
         self.export_name = cfg["postprocess"]["export_name"]
+        self.postprocess_opts = dict(
+            weld_tol=self.weld_tol, decimate_faces=self.decimate_faces,
+            decimate_ratio=self.decimate_ratio, decimate_max_error=self.decimate_max_error,
+            uv_options=self.uv_options, uv_cache=None,
+            tex_res=self.tex_res, gutter=self.gutter, tile_size=self.tile_size,
+            png_compress_level=self.png_compress_level, png_async=self.png_async,
+            export_formats=self.export_formats, quantize=self.quantize,
+        )
+        ecfg = cfg.get("executor") or {}
+        self.postprocess_workers = int(ecfg.get("postprocess_workers", 2))
+        self.queue_size = int(ecfg.get("queue_size", 4))
+        self.shared_memory = bool(ecfg.get("shared_memory", True))
+        self.mesh_dir = cfg["postprocess"].get("mesh_dir") or os.path.join(self.out_dir, "meshes")
+        self.prompts_path = os.path.join(self.out_dir, f"{self.export_name}_prompts.json")
         os.makedirs(self.out_dir, exist_ok=True)
 
+        # Per-stage tracing (optional): spans from this process and the
+        # postprocess workers are merged into a Chrome trace at the end of a run
+        tcfg = cfg.get("trace") or {}
+        self.trace_dir = None
+        if tcfg.get("enabled", False):
+            self.trace_dir = tcfg.get("dir") or os.path.join(self.out_dir, "trace")
+            trace.enable(self.trace_dir, reset=True)
+        self.postprocess_opts["trace_dir"] = self.trace_dir
+
+        # Content-addressed mesh / asset cache (optional)
+        acfg = cfg.get("asset_cache") or {}
+        self.asset_cache = None
+        if acfg.get("dir"):
+            self.asset_cache = AssetCache(
+                acfg["dir"],
+                max_bytes=int(acfg.get("max_gb", 20) * (1 << 30)),
+                link=acfg.get("link", True),
+            )
+            if cfg["postprocess"].get("uv_cache", True):
+                # workers reopen the cache to reuse unwraps of identical geometry
+                self.postprocess_opts["uv_cache"] = dict(
+                    root=self.asset_cache.root, max_bytes=self.asset_cache.max_bytes, link=self.asset_cache.link,
+                )
+
+    def _timed(self, name, build):
+        t0 = time.perf_counter()
+        with trace.span(f"setup.{name}", "setup"):
+            obj = build()
+        self.timings[name] = time.perf_counter() - t0
+        return obj
+
+    def finish_trace(self):
+        """
+        Write `<trace_dir>/trace.json` (Chrome trace) and print the per-span /
+        per-sample summary. No-op when tracing is off.
+        """
+        if self.trace_dir is None:
+            return
+        trace.flush()
+        events = trace.load_events(self.trace_dir)
+        path = trace.export_chrome(self.trace_dir)
+        table = trace.format_summary(events)
+        with open(os.path.join(self.trace_dir, "summary.txt"), "w", encoding="utf-8") as f:
+            f.write(table + "\n")
+        print("[CoX-3D] Trace summary:\n" + table)
+        print(f"[CoX-3D] Chrome trace saved to {path}")
+
+    def _seed_torch(self):
+        # torch is only imported (and seeded) once a stage needs it
+        if not self._torch_seeded:
+            import torch
+            seed = self.cfg.get("seed", 0)
+            torch.manual_seed(seed)
+            if torch.cuda.is_available():
+                torch.cuda.manual_seed_all(seed)
+            self._torch_seeded = True
+
+    @cached_property
+    def ds(self):
+        from core.datasets.ugc_dataset import UGCDataset
+        return self._timed("dataset", lambda: UGCDataset(
+            path_jsonl=self.cfg["dataset"]["path_jsonl"],
+            image_root=self.cfg["dataset"]["image_root"],
+            lazy=self.cfg["dataset"].get("lazy", False),
+            columnar=self.cfg["dataset"].get("columnar", False),
+        ))
+
+    @cached_property
+    def embedding_cache(self):
+        # Persistent embedding cache (optional)
+        cache_dir = self.cfg["semantic"].get("embedding_cache")
+        if not cache_dir:
+            return None
+        from core.semantics.embedding_cache import EmbeddingCache
+        return EmbeddingCache(cache_dir, dtype=self.cfg["semantic"].get("embedding_cache_dtype", "float32"))
+
+    @cached_property
+    def text_encoder(self):
+        self._seed_torch()
+        from core.semantics.text_encoder import FrozenSentenceEncoder
+        return self._timed("text_encoder", lambda: FrozenSentenceEncoder(
+            device=self.device,
+            batch_size=self.cfg["semantic"].get("encoder_batch_size", 4096),
+        ))
+
+    @cached_property
+    def ellm(self):
+        # Stage I: ELLM semantic modeling
+        scfg = self.cfg["semantic"]
+        enc = self.text_encoder
+        self._seed_torch()
+        from core.semantics.bertopic_llm import ELLM
+        return self._timed("ellm", lambda: ELLM(
+            text_encoder=enc,
+            topic_k=scfg["topic_k"],
+            use_bertopic=scfg["use_bertopic"],
+            llm_filter=scfg["llm_filter"],
+            lambda_kl=scfg["lambda_kl"],
+            device=self.device,
+            incremental=scfg.get("incremental", False),
+            window_seconds=scfg.get("window_seconds", 86400),
+            chunk_size=scfg.get("chunk_size", 1024),
+            design_terms=scfg.get("design_terms"),
+            embedding_store=(
+                self.embedding_cache.store(enc.encoder_id, enc.dim)
+                if self.embedding_cache is not None else None
+            ),
+        ))
+
+    @cached_property
+    def shap_mapper(self):
+        from core.semantics.shap_mapper import SHAPMapper
+        return SHAPMapper(num_factors=self.cfg["semantic"]["topic_k"])
+
+    @cached_property
+    def clip(self):
+        # Stage II: CLIP alignment (optional; not used by run())
+        self._seed_torch()
+        from core.alignment.clip_alignment import CLIPAligner
+        return self._timed("clip", lambda: CLIPAligner(device=self.device, embedding_cache=self.embedding_cache))
+
+    @cached_property
+    def generator(self):
+        # Stage III-IV: Generation (minimal runnable instantiation)
+        self._seed_torch()
+        from core.generation.instantiations.shapee_text2mesh import ShapeEText2Mesh
+        g = self.cfg["generation"]
+        return self._timed("generator", lambda: ShapeEText2Mesh(
+            device=self.device,
+            steps=g["shapee_steps"],
+            guidance_scale=g["guidance_scale"],
+            max_batch_size=g.get("max_batch_size", 4),
+        ))
+
     def run(self):
+        if "semantic" in self.stages:
+            prompts = self.run_semantic()
+        elif "generation" in self.stages:
+            with open(self.prompts_path, "r", encoding="utf-8") as f:
+                prompts = json.load(f)
+        else:
+            return self.run_postprocess_saved()
+        if "generation" in self.stages:
+            self.run_generation(prompts)
+        else:
+            with open(self.prompts_path, "w", encoding="utf-8") as f:
+                json.dump(prompts, f, ensure_ascii=False, indent=2)
+            print(f"[CoX-3D] Prompts saved to {self.prompts_path}")
+
+    def run_semantic(self):
+        from core.datasets.preprocess import dedup_near_duplicates
+
         # Minimal demo: generate 1–2 objects from dataset texts
         items = [self.ds[i] for i in range(min(2, len(self.ds)))]
 
+        # Collapse reposts / template spam into weighted representatives
+        weights = None
+        if self.dedup:
+            with trace.span("dedup", "semantic", rows=len(items)):
+                reps, weights, _ = dedup_near_duplicates(
+                    [it["text"] for it in items],
+                    threshold=self.dedup_threshold, num_perm=self.dedup_num_perm,
+                )
+            items = [items[i] for i in reps]
+
         texts = [it["text"] for it in items]
         times = [it["timestamp"] for it in items]
 
         # Stage I: ELLM
-        sem = self.ellm(texts, times)
+        ellm = self.ellm
+        with trace.span("ellm", "semantic", rows=len(texts)):
+            sem = ellm(texts, times, weights=weights)
         _ = self.shap_mapper.map_topics_to_factors(sem["topic_ids"])  # placeholder
 
-        for idx, it in enumerate(items):
-            prompt = sem["prompts"][idx]
+        for idx, prompt in enumerate(sem["prompts"]):
             print(f"\n[CoX-3D] Sample {idx} prompt:\n  {prompt}")
+        return sem["prompts"]
 
-            tri_mesh = self.generator(prompt)  # verts, faces, vcolors
+    def _manifest_paths(self):
+        return sorted(glob.glob(os.path.join(self.out_dir, f"{self.export_name}_manifest*.jsonl")))
 
-            verts, faces, vcolors = tri_mesh["verts"], tri_mesh["faces"], tri_mesh["vcolors"]
+    def completed_indices(self):
+        """
+        Indices whose latest manifest entry (across all shards' manifests)
+        is a success for the selected stages: a "saved" mesh (from a run
+        without postprocess) still needs exporting when postprocess is on.
+        """
+        last = {}
+        for path in self._manifest_paths():
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line after a crash
+                    last[rec["index"]] = rec["status"]
+        ok = ("done", "cached") if "postprocess" in self.stages else ("done", "cached", "saved")
+        return {i for i, status in last.items() if status in ok}
 
-            # UV unwrap
-            new_verts, new_faces, uvs, vmapping = unwrap_uv_xatlas(verts, faces)
-            new_vcolors = vcolors[vmapping]
+    def run_batch(self, start=None, end=None, shard=None, num_shards=None):
+        """
+        Resumable full-dataset run: every item in [start, end) (default: the
+        whole dataset, or this shard's contiguous slice) gets one asset named
+        by its dataset index. Items are processed `batch.chunk_size` at a
+        time (ELLM -> generation -> postprocess), and each finished item is
+        appended to `<out_dir>/<export_name>_manifest[.shard<i>of<n>].jsonl`
+        with its status, timings and output paths. Items already completed in
+        any manifest are skipped, so a crashed or interrupted run (or a
+        re-sharded one) picks up where it stopped.
 
-            # Bake vertex colors -> UV texture
-            tex = bake_vertex_colors_to_texture(
-                new_verts, new_faces, new_vcolors, uvs, tex_res=self.tex_res
-            )
+        Returns:
+          number of failed items in this run
+        """
+        from core.datasets.preprocess import dedup_near_duplicates
 
-            name = f"{self.export_name}_{idx}"
-            obj_path = export_obj_mtl_png(
-                out_dir=self.out_dir,
-                name=name,
-                verts=new_verts,
-                faces=new_faces,
-                uvs=uvs,
-                texture=tex,
-            )
+        if "semantic" not in self.stages or "generation" not in self.stages:
+            raise ValueError("Batch mode needs the semantic and generation stages")
+        bcfg = self.cfg.get("batch") or {}
+        shard = int(bcfg.get("shard", 0) if shard is None else shard)
+        num_shards = int(bcfg.get("num_shards", 1) if num_shards is None else num_shards)
+        if not 0 <= shard < num_shards:
+            raise ValueError(f"Invalid shard {shard} of {num_shards}")
+        start = bcfg.get("start") if start is None else start
+        end = bcfg.get("end") if end is None else end
+        chunk_size = int(bcfg.get("chunk_size", 64))
+
+        # the selected range is split into contiguous per-shard slices
+        lo = 0 if start is None else max(0, int(start))
+        hi = len(self.ds) if end is None else min(len(self.ds), int(end))
+        hi = max(lo, hi)
+        lo, hi = lo + (hi - lo) * shard // num_shards, lo + (hi - lo) * (shard + 1) // num_shards
+
+        done = self.completed_indices()
+        pending = [i for i in range(lo, hi) if i not in done]
+        suffix = f".shard{shard}of{num_shards}" if num_shards > 1 else ""
+        manifest = os.path.join(self.out_dir, f"{self.export_name}_manifest{suffix}.jsonl")
+        print(f"[CoX-3D] Batch [{lo}, {hi}): {hi - lo - len(pending)} done, {len(pending)} pending -> {manifest}")
+
+        failed = 0
+        with open(manifest, "a", encoding="utf-8") as mf:
+            def record(res):
+                nonlocal failed
+                failed += res["status"] == "failed"
+                rec = dict(res, shard=shard, time=time.time())
+                mf.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                mf.flush()
+                os.fsync(mf.fileno())  # a crash loses at most the item in progress
+
+            for s in range(0, len(pending), chunk_size):
+                indices = pending[s:s + chunk_size]
+                items = [self.ds[i] for i in indices]
+                texts = [it["text"] for it in items]
+                times = [it["timestamp"] for it in items]
+
+                # near-duplicates share one prompt (and, with the asset cache, one asset)
+                weights, inverse = None, None
+                if self.dedup:
+                    with trace.span("dedup", "semantic", rows=len(texts)):
+                        reps, weights, inverse = dedup_near_duplicates(
+                            texts, threshold=self.dedup_threshold, num_perm=self.dedup_num_perm,
+                        )
+                    texts, times = [texts[i] for i in reps], [times[i] for i in reps]
+                ellm = self.ellm
+                t0 = time.perf_counter()
+                with trace.span("ellm", "semantic", rows=len(texts)):
+                    prompts = ellm(texts, times, weights=weights)["prompts"]
+                dt = (time.perf_counter() - t0) / len(indices)
+                if inverse is not None:
+                    prompts = [prompts[g] for g in inverse]
+
+                def on_result(res):
+                    res["timings"]["semantic"] = dt
+                    record(res)
+
+                self.run_generation(prompts, indices=indices, on_result=on_result)
+                print(f"[CoX-3D] Batch progress: {min(s + chunk_size, len(pending))}/{len(pending)}")
+        print(f"[CoX-3D] Batch finished: {len(pending) - failed} ok, {failed} failed")
+        return failed
+
+    def run_postprocess_saved(self):
+        """
+        Postprocess-only: export every mesh saved in `mesh_dir`.
+        """
+        import numpy as np
+
+        def produce():
+            for path in sorted(glob.glob(os.path.join(self.mesh_dir, "*.npz"))):
+                name = os.path.splitext(os.path.basename(path))[0]
+                try:
+                    with np.load(path) as z:
+                        mesh = Mesh(**{k: z[k] for k in ("verts", "faces", "vcolors")})
+                except Exception as e:
+                    yield name, None, f"{type(e).__name__}: {e}"
+                    continue
+                yield name, (self._handoff(mesh, shared, name), self.out_dir, name, self.postprocess_opts), None
+
+        shared = {}
+        try:
+            for name, paths, err, _ in run_staged(produce, postprocess_mesh, self.postprocess_workers, self.queue_size):
+                self._release(shared, name)
+                if err is not None:
+                    print(f"[Failed] {name}: {err}")
+                else:
+                    print("[Done] Exported Blender-ready asset:\n  " + "\n  ".join(paths))
+        finally:
+            self._release(shared)
+
+    def _handoff(self, mesh, shared, key):
+        # postprocess workers map the mesh from shared memory instead of unpickling a copy
+        if self.postprocess_workers and self.shared_memory:
+            mesh = shared[key] = mesh.share()
+        return mesh
+
+    def _release(self, shared, key=None):
+        # free the shared blocks of finished items (all of them when key is None)
+        for k in list(shared) if key is None else [key]:
+            mesh = shared.pop(k, None)
+            if mesh is not None:
+                mesh.release(unlink=True)
+
+    def _save_mesh(self, name, mesh):
+        import numpy as np
+        os.makedirs(self.mesh_dir, exist_ok=True)
+        path = os.path.join(self.mesh_dir, f"{name}.npz")
+        np.savez(path, **mesh.arrays())
+        return path
 
-            print(f"[Done] Exported Blender-ready asset:\n  {obj_path}")
+    def run_generation(self, prompts, indices=None, on_result=None):
+        """
+        Generate (and postprocess) one asset per prompt. Generation feeds a
+        bounded queue consumed by `executor.postprocess_workers` processes
+        running unwrap + bake + export, so the generator keeps sampling while
+        earlier meshes are postprocessed; a failing sample is reported and
+        does not stop the others. Output names depend only on the sample
+        index (`indices`, default 0..N-1).
+
+        on_result: optional callback receiving each sample's result as soon as
+        it is final.
+
+        Returns:
+          one {index, name, prompt, status, paths, error, timings} dict per
+          prompt, status in ("done", "cached", "saved", "failed")
+        """
+        indices = list(range(len(prompts))) if indices is None else list(indices)
+        names = [f"{self.export_name}_{i}" for i in indices]
+        postprocess = "postprocess" in self.stages
+        results = [
+            dict(index=indices[idx], name=names[idx], prompt=p, status=None, paths=[], error=None, timings={})
+            for idx, p in enumerate(prompts)
+        ]
+
+        def finish(idx, **kw):
+            results[idx].update(**kw)
+            if on_result is not None:
+                on_result(results[idx])
+
+        # Diffusion runs over consecutive prompts, reseeded per run: a mesh
+        # depends on the run size and its position in it, so both are keyed
+        bs = self.cfg["generation"].get("max_batch_size", 4)
+        batches = [list(range(s, min(s + bs, len(prompts)))) for s in range(0, len(prompts), bs)]
+
+        # Repeated prompts: restore exported assets (or reuse the mesh)
+        cache = self.asset_cache
+        todo = list(range(len(prompts)))
+        if cache is not None:
+            mesh_keys = [self._mesh_key(prompts[i], len(b), pos) for b in batches for pos, i in enumerate(b)]
+            asset_keys = [self._asset_key(k) for k in mesh_keys]
+            if postprocess:
+                todo = []
+                for idx in range(len(prompts)):
+                    with trace.span("cache.restore", "cache", sample=names[idx]):
+                        paths = cache.restore_assets(asset_keys[idx], self.out_dir, names[idx])
+                    if paths is None:
+                        todo.append(idx)
+                    else:
+                        finish(idx, status="cached", paths=paths)
+                        print("[Cached] Restored Blender-ready asset:\n  " + "\n  ".join(paths))
+
+        def meshes():
+            # per batch: cached meshes, then one diffusion run if any is missing
+            # (the whole batch is re-run so every position sees the same noise)
+            wanted = set(todo)
+            for batch in batches:
+                missing = []
+                for idx in batch:
+                    if idx not in wanted:
+                        continue
+                    mesh = None
+                    if cache is not None:
+                        with trace.span("cache.get_mesh", "cache", sample=names[idx]):
+                            mesh = cache.get_mesh(mesh_keys[idx])
+                    if mesh is None:
+                        missing.append(idx)
+                    else:
+                        yield idx, mesh, None
+                if not missing:
+                    continue
+                t0 = time.perf_counter()
+                try:
+                    with trace.span("generate", "generation", samples=[names[i] for i in batch], batch=len(batch)):
+                        out = self.generator.generate_batch([prompts[i] for i in batch], seed=self.cfg.get("seed", 0))
+                        out = [Mesh.from_dict(m) for m in out]
+                        trace.annotate(faces=sum(len(m.faces) for m in out))
+                except Exception as e:
+                    for idx in missing:
+                        yield idx, None, f"generation failed: {type(e).__name__}: {e}"
+                    continue
+                dt = (time.perf_counter() - t0) / len(batch)  # amortized over the batch
+                for idx, mesh in zip(batch, out):
+                    if cache is not None:
+                        with trace.span("cache.put_mesh", "cache", sample=names[idx]):
+                            cache.put_mesh(mesh_keys[idx], mesh)
+                    if idx in missing:
+                        results[idx]["timings"]["generate"] = dt
+                        yield idx, mesh, None
+
+        if not postprocess:
+            for idx, mesh, err in meshes():
+                if err is None:
+                    with trace.span("save_mesh", "io", sample=names[idx], faces=len(mesh.faces)):
+                        path = self._save_mesh(names[idx], mesh)
+                    finish(idx, status="saved", paths=[path])
+                    print(f"[Done] Saved mesh: {path}")
+                else:
+                    finish(idx, status="failed", error=err)
+                    print(f"[Failed] {names[idx]}: {err}")
+            return results
+
+        stages = {}
+
+        def jobs():
+            for idx, mesh, err in meshes():
+                if err is not None:
+                    yield idx, None, err
+                    continue
+                # with a cache, export into a staging dir first (see below)
+                target = self.out_dir
+                if cache is not None:
+                    target = stages[idx] = tempfile.mkdtemp(prefix=".stage_", dir=self.out_dir)
+                yield idx, (self._handoff(mesh, shared, idx), target, names[idx], self.postprocess_opts), None
+
+        shared = {}
+        try:
+            for idx, paths, err, dt in run_staged(jobs, postprocess_mesh, self.postprocess_workers, self.queue_size):
+                self._release(shared, idx)
+                stage = stages.pop(idx, None)
+                if err is None and stage is not None:
+                    # cache the staged files, then move them into place
+                    with trace.span("cache.put_assets", "cache", sample=names[idx]):
+                        cache.put_assets(asset_keys[idx], stage, names[idx], paths)
+                        for fn in os.listdir(stage):
+                            os.replace(os.path.join(stage, fn), os.path.join(self.out_dir, fn))
+                    paths = [os.path.join(self.out_dir, os.path.basename(p)) for p in paths]
+                if stage is not None:
+                    shutil.rmtree(stage, ignore_errors=True)
+
+                if err is None:
+                    results[idx]["timings"]["postprocess"] = dt
+                    finish(idx, status="done", paths=paths)
+                    print("[Done] Exported Blender-ready asset:\n  " + "\n  ".join(paths))
+                else:
+                    finish(idx, status="failed", error=err)
+                    print(f"[Failed] {names[idx]}: {err}")
+        finally:
+            self._release(shared)
+
+        if cache is not None:
+            print(f"[CoX-3D] Asset cache: {cache.stats()}")
+        return results
+
+    def _mesh_key(self, prompt, batch_size=1, position=0):
+        # batch_size / position: the diffusion run the prompt is sampled in
+        g = self.cfg["generation"]
+        return cache_key(
+            prompt=prompt, seed=self.cfg.get("seed", 0), impl=g["impl"],
+            steps=g["shapee_steps"], guidance_scale=g["guidance_scale"],
+            batch_size=batch_size, position=position,
+            code=code_version("generation"),
+        )
+
+    def _asset_key(self, mesh_key):
+        return cache_key(
+            mesh=mesh_key, weld_tol=self.weld_tol, decimate_faces=self.decimate_faces,
+            decimate_ratio=self.decimate_ratio, decimate_max_error=self.decimate_max_error,
+            uv=self.uv_options,
+            tex_res=self.tex_res, gutter=self.gutter,
+            formats=sorted(self.export_formats), quantize=self.quantize,
+            png_compress_level=self.png_compress_level,
+            code=code_version("postprocess", "engine/executor.py", "engine/mesh.py"),
+        )
@@ -0,0 +1,256 @@
+import functools
+import glob
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+_tracer = None  # set by enable(); None keeps every hook a no-op
+
+
+def _rss_mb():
+    # current resident set size (Linux); falls back to the process high-water mark
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1 << 20)
+    except (OSError, ValueError, IndexError):
+        return _peak_rss_mb()
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+class _Null:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _Null()
+
+
+class _Span:
+    def __init__(self, tracer, name, cat, args):
+        self.tracer, self.name, self.cat, self.args = tracer, name, cat, args
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        # nested spans inherit the sample they belong to
+        if stack and "sample" not in self.args and "samples" not in self.args:
+            for key in ("sample", "samples"):
+                if key in stack[-1].args:
+                    self.args[key] = stack[-1].args[key]
+        stack.append(self)
+        self.rss0 = _rss_mb()
+        self.cpu0 = time.process_time()
+        self.t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        t1 = time.perf_counter_ns()
+        cpu = time.process_time() - self.cpu0
+        self.tracer._stack().pop()
+        rss = _rss_mb()
+        args = dict(
+            self.args, cpu_s=round(cpu, 6), rss_mb=round(rss, 1),
+            rss_delta_mb=round(rss - self.rss0, 1), peak_rss_mb=round(_peak_rss_mb(), 1),
+        )
+        if exc_type is not None:
+            args["error"] = exc_type.__name__
+        self.tracer._emit(dict(
+            name=self.name, cat=self.cat, ph="X", ts=self.t0 / 1000, dur=(t1 - self.t0) / 1000,
+            pid=os.getpid(), tid=threading.get_native_id(), args=args,
+        ))
+        return False
+
+    def annotate(self, **args):
+        self.args.update(args)
+
+
+class Tracer:
+    """
+    Collects Chrome trace "complete" events (wall time, process CPU time,
+    current / peak RSS and caller-supplied sizes per span) and appends them
+    to `<trace_dir>/events-<pid>.jsonl`, so worker processes trace into the
+    same directory as the main process.
+    """
+
+    def __init__(self, trace_dir: str, role: str = "main"):
+        self.trace_dir = trace_dir
+        self.events = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        os.makedirs(trace_dir, exist_ok=True)
+        self._emit(dict(name="process_name", ph="M", pid=os.getpid(), tid=0, args={"name": f"{role} ({os.getpid()})"}))
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _emit(self, event):
+        with self._lock:
+            self.events.append(event)
+
+    def span(self, name, cat="stage", **args):
+        return _Span(self, name, cat, args)
+
+    def annotate(self, **args):
+        stack = self._stack()
+        if stack:
+            stack[-1].annotate(**args)
+
+    def flush(self):
+        with self._lock:
+            events, self.events = self.events, []
+        if events:
+            with open(os.path.join(self.trace_dir, f"events-{os.getpid()}.jsonl"), "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(e) + "\n" for e in events))
+
+
+def enable(trace_dir: str, role: str = "main", reset: bool = False):
+    """
+    Turn tracing on for this process (idempotent for the same directory).
+    reset=True drops events left in `trace_dir` by a previous run.
+    """
+    global _tracer
+    if _tracer is not None and _tracer.trace_dir == trace_dir:
+        return _tracer
+    if reset:
+        for path in glob.glob(os.path.join(trace_dir, "events-*.jsonl")):
+            os.remove(path)
+    _tracer = Tracer(trace_dir, role)
+    return _tracer
+
+
+def disable():
+    global _tracer
+    if _tracer is not None:
+        _tracer.flush()
+    _tracer = None
+
+
+def enabled():
+    return _tracer is not None
+
+
+def span(name, cat="stage", **args):
+    """
+    Context manager timing a block; `args` (e.g. sample, faces) are stored
+    with the event. A shared no-op when tracing is off.
+    """
+    return _NULL if _tracer is None else _tracer.span(name, cat, **args)
+
+
+def annotate(**args):
+    """
+    Attach values (e.g. output sizes) to the innermost open span.
+    """
+    if _tracer is not None:
+        _tracer.annotate(**args)
+
+
+def flush():
+    if _tracer is not None:
+        _tracer.flush()
+
+
+def traced(name=None, cat="stage", sizes=None):
+    """
+    Decorator form of `span`; `sizes(result)` may return a dict of output
+    sizes to store with the event. Costs one global lookup when tracing is off.
+    """
+    def deco(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return fn(*args, **kwargs)
+            with _tracer.span(label, cat) as sp:
+                out = fn(*args, **kwargs)
+                if sizes is not None:
+                    sp.annotate(**sizes(out))
+                return out
+        return wrapper
+    return deco
+
+
+def file_bytes(path):
+    # `sizes` helper for exporters returning the written path
+    return {"bytes": os.path.getsize(path)}
+
+
+def load_events(trace_dir: str):
+    events = []
+    for path in sorted(glob.glob(os.path.join(trace_dir, "events-*.jsonl"))):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue  # torn line from a crashed worker
+    return events
+
+
+def export_chrome(trace_dir: str, out_path: str = None):
+    """
+    Merge every process's events into a Chrome trace (chrome://tracing,
+    Perfetto). Returns the written path.
+    """
+    out_path = out_path or os.path.join(trace_dir, "trace.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": load_events(trace_dir), "displayTimeUnit": "ms"}, f)
+    return out_path
+
+
+def summarize(events):
+    """
+    Returns:
+      per_span {name: {count, wall_s, cpu_s, max_s, rss_mb}} (rss_mb: largest
+      RSS at the end of a span; peak_rss_mb in the events is the process
+      high-water mark, which spawned workers inherit from their parent),
+      per_sample {sample: {name: wall_s}} (batched spans split evenly)
+    """
+    per_span, per_sample = {}, {}
+    for e in events:
+        if e.get("ph") != "X":
+            continue
+        s = per_span.setdefault(e["name"], dict(count=0, wall_s=0.0, cpu_s=0.0, max_s=0.0, rss_mb=0.0))
+        dur = e["dur"] / 1e6
+        args = e.get("args", {})
+        s["count"] += 1
+        s["wall_s"] += dur
+        s["cpu_s"] += args.get("cpu_s", 0.0)
+        s["max_s"] = max(s["max_s"], dur)
+        s["rss_mb"] = max(s["rss_mb"], args.get("rss_mb", 0.0))
+        samples = args.get("samples") or ([args["sample"]] if "sample" in args else [])
+        for sample in samples:
+            row = per_sample.setdefault(sample, {})
+            row[e["name"]] = row.get(e["name"], 0.0) + dur / len(samples)
+    return per_span, per_sample
+
+
+def format_summary(events):
+    per_span, per_sample = summarize(events)
+    lines = [f"{'span':<22}{'count':>7}{'wall s':>10}{'mean ms':>10}{'max ms':>10}{'cpu s':>10}{'rss MB':>10}"]
+    for name, s in sorted(per_span.items(), key=lambda kv: -kv[1]["wall_s"]):
+        lines.append(
+            f"{name:<22}{s['count']:>7}{s['wall_s']:>10.3f}{1e3 * s['wall_s'] / s['count']:>10.1f}"
+            f"{1e3 * s['max_s']:>10.1f}{s['cpu_s']:>10.3f}{s['rss_mb']:>10.1f}"
+        )
+    if per_sample:
+        cols = list(dict.fromkeys(k for row in per_sample.values() for k in row))
+        lines.append("")
+        lines.append(f"{'sample':<22}" + "".join(f"{c[:11]:>12}" for c in cols))
+        for sample, row in sorted(per_sample.items()):
+            lines.append(f"{str(sample)[:22]:<22}" + "".join(
+                f"{row[c]:>12.3f}" if c in row else f"{'-':>12}" for c in cols
+            ))
+    return "\n".join(lines)
@@ -1,16 +1,112 @@
+import math
+
 import torch
 
+# spatial hash primes (Instant-NGP)
+_PRIMES = (1, 2654435761, 805459861)
+
+
+class HashGridEncoding(torch.nn.Module):
+    """
+    Multiresolution hash-grid encoding (Instant-NGP): `levels` grids from
+    `base_res` to `max_res` cells per axis over [-bound, bound]^3, each
+    storing `features` trainable values per vertex in a table of
+    2**log2_table entries (dense indexing for levels small enough to fit,
+    spatial hashing above). A point's encoding is the trilinear
+    interpolation of its cell corners, concatenated over levels.
+    """
+
+    def __init__(self, levels=16, features=2, log2_table=15, base_res=16, max_res=512, bound=1.0,
+                 block=2048):
+        super().__init__()
+        self.bound = float(bound)
+        self.table_size = 1 << int(log2_table)
+        growth = math.exp((math.log(max_res) - math.log(base_res)) / max(levels - 1, 1))
+        res = torch.tensor([int(base_res * growth ** lvl) for lvl in range(levels)], dtype=torch.int64)
+        dense = (res + 1) ** 3 <= self.table_size
+        self.register_buffer("res", res.int(), persistent=False)
+        # per-axis index multipliers: row-major strides for dense levels, hash primes above
+        side = res + 1
+        mult = torch.stack([torch.ones_like(res), side, side * side], dim=-1)
+        mult[~dense] = torch.tensor(_PRIMES)
+        # int32 halves memory traffic; wrap-around keeps the low (table) bits exact
+        mult = torch.where(mult >= 1 << 31, mult - (1 << 32), mult).int()
+        self.register_buffer("mult", mult, persistent=False)
+        self.register_buffer("dense", dense, persistent=False)
+        self.register_buffer("offset", (torch.arange(levels) * self.table_size).int(), persistent=False)
+        self.embeddings = torch.nn.Parameter(torch.empty(levels, self.table_size, features).uniform_(-1e-4, 1e-4))
+        self.out_dim = levels * features
+        self.block = int(block)
+
+    def forward(self, x):
+        flat = x.reshape(-1, 3)
+        if len(flat) == 0:
+            return x.new_zeros(*x.shape[:-1], self.out_dim)
+        # blocks of points keep the [8,L,block] temporaries cache-sized
+        out = torch.cat([self._encode(flat[s:s + self.block]) for s in range(0, len(flat), self.block)])
+        return out.reshape(*x.shape[:-1], self.out_dim)
+
+    def _encode(self, x):
+        # level-major [.., L, N] layout keeps the N axis contiguous in every broadcast
+        u = ((x + self.bound) / (2 * self.bound)).clamp(0.0, 1.0)
+        pos = u.T[:, None, :] * self.res[None, :, None]                     # [3,L,N]
+        p0 = pos.floor().int().clamp(max=self.res[None, :, None] - 1)
+        frac = pos - p0
+
+        # per axis and side (p0 / p0+1): index term and interpolation weight
+        c = torch.stack([p0, p0 + 1]) * self.mult.T[None, :, :, None]       # [2,3,L,N]
+        w = torch.stack([1.0 - frac, frac])
+        cx, cy, cz = c[:, None, None, 0], c[None, :, None, 1], c[None, None, :, 2]
+        k = int(self.dense.sum())  # dense levels come first (resolution grows)
+        idx = torch.cat([
+            cx[..., :k, :] + cy[..., :k, :] + cz[..., :k, :],
+            cx[..., k:, :] ^ cy[..., k:, :] ^ cz[..., k:, :],
+        ], dim=-2)
+        idx = (idx & (self.table_size - 1)) + self.offset[:, None]          # [2,2,2,L,N]
+        wt = w[:, None, None, 0] * w[None, :, None, 1] * w[None, None, :, 2]
+
+        feats = self.embeddings.reshape(-1, self.embeddings.shape[-1])[idx.reshape(-1)]
+        out = (wt.reshape(8, -1, 1) * feats.reshape(8, -1, feats.shape[-1])).sum(0)   # [L*N,F]
+        out = out.reshape(len(self.res), -1, out.shape[-1]).transpose(0, 1)           # [N,L,F]
+        return out.reshape(len(x), self.out_dim)
+
+
 class NeRF(torch.nn.Module):
     """
-    Paper-level NeRF skeleton.
+    Paper-level NeRF skeleton: MLP from a 3D point to (sigma, rgb) logits.
+
+    encoding="hashgrid" feeds it `HashGridEncoding` features (kwargs in
+    `encoding_kwargs`) instead of raw xyz. Rendering lives in
+    `core.generation.abstract.renderer`.
     """
-    def __init__(self):
+    def __init__(self, encoding=None, hidden=256, bound=1.0, encoding_kwargs=None):
         super().__init__()
+        self.encoding = None
+        in_dim = 3
+        if encoding == "hashgrid":
+            self.encoding = HashGridEncoding(bound=bound, **(encoding_kwargs or {}))
+            in_dim = self.encoding.out_dim
+        elif encoding is not None:
+            raise ValueError(f"Unknown NeRF encoding: {encoding}")
         self.mlp = torch.nn.Sequential(
-            torch.nn.Linear(3, 256),
+            torch.nn.Linear(in_dim, hidden),
             torch.nn.ReLU(),
-            torch.nn.Linear(256, 4)  # sigma + rgb
+            torch.nn.Linear(hidden, 4)  # sigma + rgb
         )
 
     def forward(self, x):
+        if self.encoding is not None:
+            x = self.encoding(x)
         return self.mlp(x)
+
+    def query(self, x):
+        """
+        Returns:
+          sigma [...] >= 0, rgb [...,3] in [0,1]
+        """
+        raw = self(x)
+        # softplus (not ReLU) keeps density gradients alive in empty space
+        return torch.nn.functional.softplus(raw[..., 0]), torch.sigmoid(raw[..., 1:])
+
+    def density(self, x):
+        return self.query(x)[0]
@@ -0,0 +1,202 @@
+import math
+
+import torch
+
+
+class OccupancyGrid(torch.nn.Module):
+    """
+    Coarse occupancy of [-bound, bound]^3 for empty-space skipping. Each
+    `update(model)` scores a cell by the max density over its 8 corners and
+    `samples` jittered interior points, and keeps max(decayed old density,
+    new density); a cell is occupied while its density exceeds
+    min(threshold, mean density), and the mask is dilated by one cell so
+    thin surfaces between samples are not skipped. Every cell is occupied
+    until the first update.
+    """
+
+    def __init__(self, resolution=64, bound=1.0, threshold=0.01, decay=0.95):
+        super().__init__()
+        self.resolution = int(resolution)
+        self.bound = float(bound)
+        self.threshold = float(threshold)
+        self.decay = float(decay)
+        shape = (self.resolution,) * 3
+        self.register_buffer("density", torch.zeros(shape))
+        self.register_buffer("mask", torch.ones(shape, dtype=torch.bool))
+        self.register_buffer("updates", torch.zeros((), dtype=torch.int64))
+
+    def _cells(self, x):
+        u = (x + self.bound) / (2 * self.bound) * self.resolution
+        return u.floor().long().clamp(0, self.resolution - 1)
+
+    @torch.no_grad()
+    def _eval(self, model, u, chunk):
+        # density at grid coordinates u [N,3] (cell units)
+        out = torch.empty(len(u), device=u.device)
+        for s in range(0, len(u), chunk):
+            out[s:s + chunk] = model.density(u[s:s + chunk] / self.resolution * 2 * self.bound - self.bound)
+        return out
+
+    def update(self, model, samples=4, chunk=1 << 16):
+        r = self.resolution
+        dev = self.density.device
+        # corners: one (r+1)^3 lattice, max over each cell's 8 corners
+        idx = torch.arange((r + 1) ** 3, device=dev)
+        ijk = torch.stack([idx // ((r + 1) ** 2), idx // (r + 1) % (r + 1), idx % (r + 1)], dim=-1)
+        corners = self._eval(model, ijk.float(), chunk).reshape((1,) + (r + 1,) * 3)
+        new = torch.nn.functional.max_pool3d(corners, 2, stride=1)[0]
+        idx = torch.arange(r ** 3, device=dev)
+        ijk = torch.stack([idx // (r * r), idx // r % r, idx % r], dim=-1)
+        for _ in range(samples):
+            x = ijk + torch.rand(len(ijk), 3, device=dev)
+            new = torch.maximum(new, self._eval(model, x, chunk).reshape(new.shape))
+        self.density.copy_(new if self.updates == 0 else torch.maximum(self.density * self.decay, new))
+        occ = self.density > min(self.threshold, self.density.mean().item())
+        occ = torch.nn.functional.max_pool3d(occ[None].float(), 3, stride=1, padding=1)[0] > 0
+        self.mask.copy_(occ)
+        self.updates += 1
+        return self.mask.float().mean().item()
+
+    def query(self, x):
+        """
+        True where x [...,3] lies in an occupied cell inside the bound.
+        """
+        inside = (x.abs() <= self.bound).all(-1)
+        c = self._cells(x)
+        return inside & self.mask[c[..., 0], c[..., 1], c[..., 2]]
+
+
+def orbit_pose(azimuth, elevation, radius=3.0):
+    """
+    Camera-to-world [4,4] on a sphere around the origin, looking at it
+    (degrees; camera looks down its -z axis, y up).
+    """
+    az, el = math.radians(azimuth), math.radians(elevation)
+    eye = torch.tensor([radius * math.cos(el) * math.sin(az), radius * math.sin(el), radius * math.cos(el) * math.cos(az)])
+    back = eye / eye.norm()
+    right = torch.linalg.cross(torch.tensor([0.0, 1.0, 0.0]), back)
+    if right.norm() < 1e-6:  # looking straight up / down
+        right = torch.tensor([1.0, 0.0, 0.0])
+    right = right / right.norm()
+    up = torch.linalg.cross(back, right)
+    c2w = torch.eye(4)
+    c2w[:3, 0], c2w[:3, 1], c2w[:3, 2], c2w[:3, 3] = right, up, back, eye
+    return c2w
+
+
+def get_rays(c2w, height, width, fov=50.0):
+    """
+    One ray per pixel centre of a pinhole camera (`fov`: vertical degrees).
+
+    Returns:
+      rays_o [H*W,3], rays_d [H*W,3] (unit length)
+    """
+    focal = 0.5 * height / math.tan(math.radians(fov) / 2)
+    j, i = torch.meshgrid(
+        torch.arange(height, dtype=torch.float32) + 0.5,
+        torch.arange(width, dtype=torch.float32) + 0.5, indexing="ij",
+    )
+    dirs = torch.stack([(i - width / 2) / focal, -(j - height / 2) / focal, -torch.ones_like(i)], dim=-1)
+    rays_d = dirs.reshape(-1, 3) @ c2w[:3, :3].T
+    rays_d = rays_d / rays_d.norm(dim=-1, keepdim=True)
+    return c2w[:3, 3].expand_as(rays_d).contiguous(), rays_d
+
+
+def _near_far(rays_o, rays_d, bound):
+    # slab intersection with the [-bound, bound]^3 box (empty when near >= far)
+    inv = 1.0 / torch.where(rays_d.abs() < 1e-9, torch.full_like(rays_d, 1e-9), rays_d)
+    t0, t1 = (-bound - rays_o) * inv, (bound - rays_o) * inv
+    near = torch.minimum(t0, t1).amax(-1).clamp(min=0.0)
+    far = torch.maximum(t0, t1).amin(-1)
+    return near, far
+
+
+def _march(model, rays_o, rays_d, num_samples, segment, grid, min_transmittance, perturb, bound):
+    n = len(rays_o)
+    near, far = _near_far(rays_o, rays_d, bound)
+    delta = (far - near).clamp(min=0.0) / num_samples
+    trans = torch.ones(n, device=rays_o.device)
+    rgb = torch.zeros(n, 3, device=rays_o.device)
+    depth = torch.zeros(n, device=rays_o.device)
+    active = torch.nonzero(far > near).squeeze(-1)
+    evals = 0
+    for s in range(0, num_samples, segment):
+        if len(active) == 0:
+            break
+        k = min(segment, num_samples - s)
+        steps = torch.arange(s, s + k, device=rays_o.device) + (torch.rand(len(active), k, device=rays_o.device) if perturb else 0.5)
+        d = delta[active, None]
+        t = near[active, None] + steps * d                                 # [A,k]
+        x = rays_o[active, None] + t[..., None] * rays_d[active, None]     # [A,k,3]
+
+        # network only on samples in occupied cells
+        occ = grid.query(x) if grid is not None else torch.ones(t.shape, dtype=torch.bool, device=t.device)
+        sigma = torch.zeros(t.shape, device=t.device)
+        color = torch.zeros(t.shape + (3,), device=t.device)
+        if occ.any():
+            sig, col = model.query(x[occ])
+            sigma = sigma.index_put((occ,), sig)
+            color = color.index_put((occ,), col)
+            evals += len(sig)
+
+        alpha = 1.0 - torch.exp(-sigma * d)
+        seg_trans = torch.cumprod(torch.cat([torch.ones_like(alpha[:, :1]), 1.0 - alpha + 1e-10], dim=1), dim=1)
+        w = trans[active, None] * alpha * seg_trans[:, :-1]
+        rgb = rgb.index_add(0, active, (w[..., None] * color).sum(1))
+        depth = depth.index_add(0, active, (w * t).sum(1))
+        left = trans[active] * seg_trans[:, -1]
+        trans = trans.index_copy(0, active, left)
+        # early ray termination: drop rays that are (almost) opaque already
+        active = active[left.detach() > min_transmittance]
+    return rgb, depth, 1.0 - trans, evals
+
+
+def render_rays(
+    model,
+    rays_o,
+    rays_d,
+    num_samples=128,
+    chunk=4096,
+    segment=16,
+    grid=None,
+    min_transmittance=1e-3,
+    background=1.0,
+    perturb=False,
+    bound=1.0,
+):
+    """
+    Volume rendering of `model` (a NeRF: `query(x)` -> sigma, rgb) along
+    rays clipped to [-bound, bound]^3, with `num_samples` evenly spaced
+    samples per ray (stratified when `perturb`).
+
+    Rays are processed `chunk` at a time and marched `segment` samples at a
+    time, so at most chunk * segment points are in flight (memory cap).
+    With an `OccupancyGrid`, samples in empty cells skip the network, and a
+    ray stops once its transmittance falls below `min_transmittance`.
+    Differentiable with respect to the model (e.g. for SDS).
+
+    Returns:
+      {rgb [N,3], depth [N], opacity [N], evals: network evaluations}
+    """
+    out = {"rgb": [], "depth": [], "opacity": [], "evals": 0}
+    for s in range(0, len(rays_o), chunk):
+        rgb, depth, opacity, evals = _march(
+            model, rays_o[s:s + chunk], rays_d[s:s + chunk], num_samples, segment,
+            grid, min_transmittance, perturb, bound,
+        )
+        out["rgb"].append(rgb + (1.0 - opacity)[:, None] * background)
+        out["depth"].append(depth)
+        out["opacity"].append(opacity)
+        out["evals"] += evals
+    for k in ("rgb", "depth", "opacity"):
+        out[k] = torch.cat(out[k]) if out[k] else torch.zeros((0, 3) if k == "rgb" else (0,))
+    return out
+
+
+def render_image(model, c2w, height, width, fov=50.0, **kwargs):
+    """
+    Render an [H,W,3] image from camera-to-world `c2w` (see `render_rays`).
+    """
+    rays_o, rays_d = get_rays(c2w, height, width, fov)
+    out = render_rays(model, rays_o, rays_d, **kwargs)
+    return out["rgb"].reshape(height, width, 3)
@@ -18,39 +18,61 @@ class ShapeEText2Mesh:
     - GPU recommended.
     """
 
-    def __init__(self, device="cuda", steps=64, guidance_scale=15.0):
+    def __init__(self, device="cuda", steps=64, guidance_scale=15.0, max_batch_size=4):
         self.device = device if torch.cuda.is_available() and device.startswith("cuda") else "cpu"
         self.steps = int(steps)
         self.guidance_scale = float(guidance_scale)
+        self.max_batch_size = int(max_batch_size)
 
         self.transmitter = load_model("transmitter", device=self.device)
         self.text_model = load_model("text300M", device=self.device)
         self.diffusion = diffusion_from_config(load_config("diffusion"))
 
-    @torch.no_grad()
-    def __call__(self, prompt: str):
-        latents = sample_latents(
-            batch_size=1,
-            model=self.text_model,
-            diffusion=self.diffusion,
-            guidance_scale=self.guidance_scale,
-            model_kwargs=dict(texts=[prompt]),
-            progress=True,
-            clip_denoised=True,
-            use_fp16=(self.device == "cuda"),
-            device=self.device,
-            num_steps=self.steps,
-        )
-
-        tri = decode_latent_mesh(self.transmitter, latents[0]).tri_mesh()
-
-        verts = tri.verts.detach().cpu().numpy().astype(np.float32)
-        faces = tri.faces.detach().cpu().numpy().astype(np.int32)
+    def _to_dict(self, latent):
+        tri = decode_latent_mesh(self.transmitter, latent).tri_mesh()
+
+        verts = tri.verts.detach().cpu().numpy().astype(np.float32, copy=False)
+        faces = tri.faces.detach().cpu().numpy().astype(np.int32, copy=False)
 
         if hasattr(tri, "vertex_channels") and "RGB" in tri.vertex_channels:
             rgb = tri.vertex_channels["RGB"].detach().cpu().numpy()
             vcolors = np.clip(rgb * 255.0, 0, 255).astype(np.uint8)
         else:
-            vcolors = np.ones((verts.shape[0], 3), dtype=np.uint8) * 200
+            vcolors = np.full((verts.shape[0], 3), 200, dtype=np.uint8)
 
         return {"verts": verts, "faces": faces, "vcolors": vcolors}
+
+    @torch.no_grad()
+    def generate_batch(self, prompts, seed=None):
+        """
+        Sample latents for many prompts per diffusion run (chunks of at most
+        `max_batch_size` prompts to bound memory), then decode one mesh per
+        latent. Returns a list of {verts, faces, vcolors} dicts in prompt
+        order (see `Mesh.from_dict`).
+
+        seed: reseed torch before every diffusion run, so a prompt's latent
+        depends only on (seed, run size, position in the run).
+        """
+        prompts = list(prompts)
+        meshes = []
+        for s in range(0, len(prompts), self.max_batch_size):
+            chunk = prompts[s:s + self.max_batch_size]
+            if seed is not None:
+                torch.manual_seed(seed)
+            latents = sample_latents(
+                batch_size=len(chunk),
+                model=self.text_model,
+                diffusion=self.diffusion,
+                guidance_scale=self.guidance_scale,
+                model_kwargs=dict(texts=chunk),
+                progress=True,
+                clip_denoised=True,
+                use_fp16=self.device.startswith("cuda"),
+                device=self.device,
+                num_steps=self.steps,
+            )
+            meshes.extend(self._to_dict(latent) for latent in latents)
+        return meshes
+
+    def __call__(self, prompt: str):
+        return self.generate_batch([prompt])[0]
@@ -1,91 +1,344 @@
+import os
+import shutil
+import tempfile
+
 import numpy as np
 from tqdm import tqdm
 
+from core.engine.trace import traced
+
+
+def _face_bboxes(tri: np.ndarray, tex_res: int):
+    """
+    Integer pixel bounding boxes of UV-space triangles [F,3,2], clamped to the texture.
+    """
+    x0 = np.maximum(np.floor(tri[:, :, 0].min(axis=1)), 0).astype(np.int64)
+    x1 = np.minimum(np.ceil(tri[:, :, 0].max(axis=1)), tex_res - 1).astype(np.int64)
+    y0 = np.maximum(np.floor(tri[:, :, 1].min(axis=1)), 0).astype(np.int64)
+    y1 = np.minimum(np.ceil(tri[:, :, 1].max(axis=1)), tex_res - 1).astype(np.int64)
+    return x0, x1, y0, y1
+
+
+def _ranges(counts: np.ndarray):
+    """
+    Concatenation of arange(c) for every c in counts.
+    """
+    out = np.arange(int(counts.sum()), dtype=np.int64)
+    out -= np.repeat(np.cumsum(counts) - counts, counts)
+    return out
+
+
+def _raster_batch(tri, col, x0, y0, w, h):
+    """
+    Rasterize a batch of triangles over their bounding boxes at once.
+
+    Every candidate pixel of every face is expanded into flat arrays, barycentrics
+    are evaluated with the same edge/dot-product formulation as the scalar baker,
+    and for pixels covered by several faces the last face (in face order) wins.
+
+    Returns:
+      px [N], py [N], rgb [N,3] uint8 for covered pixels (each pixel at most once)
+    """
+    n = w * h
+    total = int(n.sum())
+    if total == 0:
+        return None
+
+    # per-face terms (identical to the scalar bary())
+    ax, ay = tri[:, 0, 0], tri[:, 0, 1]
+    e0x, e0y = tri[:, 1, 0] - ax, tri[:, 1, 1] - ay
+    e1x, e1y = tri[:, 2, 0] - ax, tri[:, 2, 1] - ay
+    d00 = e0x * e0x + e0y * e0y
+    d01 = e0x * e1x + e0y * e1y
+    d11 = e1x * e1x + e1y * e1y
+    denom = d00 * d11 - d01 * d01
+
+    # expand faces -> bbox rows -> pixels without integer division
+    rid = np.repeat(np.arange(len(n)), h)
+    py_row = y0[rid] + _ranges(h)
+    rw = w[rid]
+    row = np.repeat(np.arange(len(rid)), rw)
+    fid = rid[row]
+    px = x0[fid] + _ranges(rw)
+    py = py_row[row]
+    del rid, py_row, rw, row
+
+    v2x = (px + 0.5) - ax[fid]
+    v2y = (py + 0.5) - ay[fid]
+    d20 = v2x * e0x[fid] + v2y * e0y[fid]
+    d21 = v2x * e1x[fid] + v2y * e1y[fid]
+    del v2x, v2y
+    fd01, fden = d01[fid], denom[fid]
+    bv = (d11[fid] * d20 - fd01 * d21) / fden
+    bw = (d00[fid] * d21 - fd01 * d20) / fden
+    del d20, d21, fd01, fden
+    bu = 1.0 - bv - bw
+
+    inside = (bu >= -1e-6) & (bv >= -1e-6) & (bw >= -1e-6)
+    if not inside.any():
+        return None
+    fid, px, py = fid[inside], px[inside], py[inside]
+    bu, bv, bw = bu[inside], bv[inside], bw[inside]
+
+    # keep only the last face touching each pixel (matches sequential overwrite);
+    # overlaps are rare (shared edges), so resolve them only where they occur
+    lin = (py - py.min()) * (int(px.max()) + 1) + px
+    cand = np.arange(len(lin))
+    owner = np.full(int(lin.max()) + 1, -1, dtype=np.int64)
+    owner[lin] = cand
+    lost = owner[lin] != cand
+    if lost.any():
+        np.maximum.at(owner, lin[lost], cand[lost])
+    keep = owner[lin] == cand
+    fid, px, py = fid[keep], px[keep], py[keep]
+    bu, bv, bw = bu[keep, None], bv[keep, None], bw[keep, None]
+
+    c = col[fid]
+    rgb = bu * c[:, 0] + bv * c[:, 1] + bw * c[:, 2]
+    return px, py, np.clip(rgb, 0, 255).astype(np.uint8)
+
+
+def _raster_region(tex, mask, ox, oy, tri, col, x0, x1, y0, y1, max_batch_pixels, progress=False):
+    """
+    Rasterize faces (in order) into a tex/mask region whose top-left texel is (ox, oy).
+    Face bounding boxes must already be clamped to the region.
+    """
+    w = np.maximum(x1 - x0 + 1, 0)
+    h = np.maximum(y1 - y0 + 1, 0)
+    area = w * h
+
+    # split faces (in order) into batches of bounded candidate-pixel count
+    csum = np.cumsum(area)
+    bounds = [0]
+    while bounds[-1] < len(area):
+        base = csum[bounds[-1] - 1] if bounds[-1] > 0 else 0
+        end = int(np.searchsorted(csum, base + max_batch_pixels, side="right"))
+        bounds.append(max(end, bounds[-1] + 1))
+
+    batches = list(zip(bounds[:-1], bounds[1:]))
+    for s, e in (tqdm(batches, desc="Baking texture") if progress else batches):
+        sel = np.nonzero(area[s:e])[0] + s
+        if len(sel) == 0:
+            continue
+        out = _raster_batch(tri[sel], col[sel], x0[sel], y0[sel], w[sel], h[sel])
+        if out is None:
+            continue
+        px, py, rgb = out
+        tex[py - oy, px - ox] = rgb
+        mask[py - oy, px - ox] = 255
+
+
+def _tiles(h: int, w: int, tile: int):
+    for y in range(0, h, tile):
+        for x in range(0, w, tile):
+            yield y, min(y + tile, h), x, min(x + tile, w)
+
+
+def _alloc(shape, dtype, work_dir, name):
+    """
+    Scratch array: in RAM when work_dir is None, else an on-disk memmap.
+    """
+    if work_dir is None:
+        return np.zeros(shape, dtype=dtype)
+    path = os.path.join(work_dir, f"{name}.npy")
+    return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+
+
+def _dilate(m: np.ndarray, r: int):
+    """
+    Square (Chebyshev) dilation of a boolean mask by radius r, via separable box sums.
+    """
+    out = m.astype(np.int32)
+    for axis in (0, 1):
+        n = out.shape[axis]
+        cs = np.cumsum(out, axis=axis, dtype=np.int32)
+        hi = np.take(cs, np.minimum(np.arange(n) + r, n - 1), axis=axis)
+        lo_idx = np.arange(n) - r - 1
+        lo = np.take(cs, np.maximum(lo_idx, 0), axis=axis)
+        shape = [1, 1]
+        shape[axis] = n
+        out = hi - lo * (lo_idx >= 0).reshape(shape)
+    return out > 0
+
+
+def fill_uv_gutter(tex: np.ndarray, mask: np.ndarray, gutter=None, tile=None, work_dir=None):
+    """
+    Pull-push gutter fill of tex (in place; mask is left untouched).
+
+    Pull: build a 2x2 box-filtered pyramid of premultiplied colour and coverage
+    down to 1x1. Push: walk back up, giving every uncovered texel the colour of
+    its parent level. Each texel is touched O(1) times, so the whole background
+    is filled in O(pixels) and mip levels of the texture never average in black.
+
+    gutter: None fills every uncovered texel; an int restricts filling to texels
+    within that many pixels (square distance) of a covered one.
+    tile/work_dir: process every level in tile x tile blocks, keeping pyramid
+    levels larger than one tile as memmaps under work_dir (out-of-core mode).
+    The result is identical to the in-memory fill.
+    """
+    H, W = mask.shape
+    if tile is None:
+        covered = mask > 0
+        if covered.all() or not covered.any():
+            return tex
+        tile = max(H, W)
+    tile += tile % 2  # keep tiles aligned with the 2x2 pyramid blocks
+
+    scratch = None if work_dir is None else tempfile.mkdtemp(prefix="pullpush_", dir=work_dir)
+    try:
+        # pull
+        def read(y0, y1, x0, x1):
+            wt = (np.asarray(mask[y0:y1, x0:x1]) > 0).astype(np.float32)
+            return wt, np.asarray(tex[y0:y1, x0:x1]).astype(np.float32) * wt[..., None]
+
+        shape = (H, W)
+        pyramid = []
+        while shape != (1, 1):
+            h, wd = shape
+            shape = ((h + 1) // 2, (wd + 1) // 2)
+            level_dir = scratch if shape[0] * shape[1] > tile * tile else None
+            lw = _alloc(shape, np.float32, level_dir, f"w{len(pyramid)}")
+            lc = _alloc(shape + (3,), np.float32, level_dir, f"c{len(pyramid)}")
+            for y0, y1, x0, x1 in _tiles(h, wd, tile):
+                w, c = read(y0, y1, x0, x1)
+                th, tw = w.shape
+                if th % 2 or tw % 2:
+                    w = np.pad(w, ((0, th % 2), (0, tw % 2)))
+                    c = np.pad(c, ((0, th % 2), (0, tw % 2), (0, 0)))
+                oy, ox = y0 // 2, x0 // 2
+                lw[oy:oy + (th + 1) // 2, ox:ox + (tw + 1) // 2] = (
+                    w[0::2, 0::2] + w[1::2, 0::2] + w[0::2, 1::2] + w[1::2, 1::2]
+                )
+                lc[oy:oy + (th + 1) // 2, ox:ox + (tw + 1) // 2] = (
+                    c[0::2, 0::2] + c[1::2, 0::2] + c[0::2, 1::2] + c[1::2, 1::2]
+                )
+            pyramid.append((lw, lc))
+            read = lambda y0, y1, x0, x1, lw=lw, lc=lc: (
+                np.asarray(lw[y0:y1, x0:x1]), np.asarray(lc[y0:y1, x0:x1])
+            )
+
+        if not pyramid or pyramid[-1][0][0, 0] == 0:
+            return tex
+
+        # push (colours overwrite the premultiplied sums in place)
+        parent = None
+        for lw, lc in reversed(pyramid):
+            for y0, y1, x0, x1 in _tiles(lw.shape[0], lw.shape[1], tile):
+                w = np.asarray(lw[y0:y1, x0:x1])
+                col = lc[y0:y1, x0:x1] / np.maximum(w, 1e-8)[..., None]
+                if parent is not None:
+                    hy, hx = np.nonzero(w == 0)
+                    pb = np.asarray(parent[y0 // 2:(y1 + 1) // 2, x0 // 2:(x1 + 1) // 2])
+                    col[hy, hx] = pb[hy // 2, hx // 2]
+                lc[y0:y1, x0:x1] = col
+            parent = lc
+
+        for y0, y1, x0, x1 in _tiles(H, W, tile):
+            holes = ~(np.asarray(mask[y0:y1, x0:x1]) > 0)
+            if gutter is not None:
+                r = int(gutter)
+                gy0, gy1 = max(y0 - r, 0), min(y1 + r, H)
+                gx0, gx1 = max(x0 - r, 0), min(x1 + r, W)
+                band = _dilate(np.asarray(mask[gy0:gy1, gx0:gx1]) > 0, r)
+                holes &= band[y0 - gy0:y1 - gy0, x0 - gx0:x1 - gx0]
+            hy, hx = np.nonzero(holes)
+            if len(hy) == 0:
+                continue
+            pb = np.asarray(parent[y0 // 2:(y1 + 1) // 2, x0 // 2:(x1 + 1) // 2])
+            tex[y0 + hy, x0 + hx] = np.clip(pb[hy // 2, hx // 2] + 0.5, 0, 255).astype(np.uint8)
+        return tex
+    finally:
+        pyramid = parent = lw = lc = None
+        if scratch is not None:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+
+@traced("bake", "postprocess", sizes=lambda tex: {"tex_res": tex.shape[0], "tex_mb": round(tex.nbytes / (1 << 20), 1)})
 def bake_vertex_colors_to_texture(
     verts: np.ndarray,
     faces: np.ndarray,
     vcolors: np.ndarray,
     uvs: np.ndarray,
     tex_res: int = 1024,
+    max_batch_pixels: int = 1 << 18,
+    gutter=None,
+    tile_size=None,
+    work_dir=None,
 ):
     """
     Minimal UV raster bake: per-vertex RGB -> UV texture PNG.
     Deterministic and fully self-contained (no Blender required).
+
+    Faces are rasterized in batches whose bounding boxes together hold at most
+    `max_batch_pixels` candidate pixels, so memory stays bounded while the
+    per-pixel work runs in NumPy instead of Python loops.
+
+    Uncovered texels are padded with `fill_uv_gutter` (whole background when
+    `gutter` is None, otherwise only texels within `gutter` px of a chart).
+
+    Tiled (out-of-core) mode, for 8K/16K textures: with `tile_size` set, the
+    texture is baked tile by tile into a `np.memmap` under `work_dir` (a new temp
+    dir if None), so peak RAM is bounded by the tile size instead of tex_res.
+    The returned memmap is identical to the in-memory bake; the caller owns
+    `work_dir/albedo.npy`.
     """
-    tex = np.zeros((tex_res, tex_res, 3), dtype=np.uint8)
-    mask = np.zeros((tex_res, tex_res), dtype=np.uint8)
+    if tile_size is None:
+        tex = np.zeros((tex_res, tex_res, 3), dtype=np.uint8)
+        mask = np.zeros((tex_res, tex_res), dtype=np.uint8)
+        tile = tex_res
+    else:
+        work_dir = work_dir or tempfile.mkdtemp(prefix="cox3d_bake_")
+        os.makedirs(work_dir, exist_ok=True)
+        tex = _alloc((tex_res, tex_res, 3), np.uint8, work_dir, "albedo")
+        mask = _alloc((tex_res, tex_res), np.uint8, work_dir, "mask")
+        tile = int(tile_size)
 
-    uv_pix = np.empty_like(uvs)
+    uv_pix = np.empty((len(uvs), 2), dtype=np.float64)
     uv_pix[:, 0] = uvs[:, 0] * (tex_res - 1)
     uv_pix[:, 1] = (1.0 - uvs[:, 1]) * (tex_res - 1)
 
-    def bbox(p0, p1, p2):
-        xs = [p0[0], p1[0], p2[0]]
-        ys = [p0[1], p1[1], p2[1]]
-        x0 = max(int(np.floor(min(xs))), 0)
-        x1 = min(int(np.ceil(max(xs))), tex_res - 1)
-        y0 = max(int(np.floor(min(ys))), 0)
-        y1 = min(int(np.ceil(max(ys))), tex_res - 1)
-        return x0, x1, y0, y1
-
-    def bary(p, a, b, c):
-        v0 = b - a
-        v1 = c - a
-        v2 = p - a
-        d00 = v0.dot(v0); d01 = v0.dot(v1); d11 = v1.dot(v1)
-        d20 = v2.dot(v0); d21 = v2.dot(v1)
-        denom = d00 * d11 - d01 * d01
-        if abs(denom) < 1e-12:
-            return None
-        v = (d11 * d20 - d01 * d21) / denom
-        w = (d00 * d21 - d01 * d20) / denom
-        u = 1.0 - v - w
-        return u, v, w
-
-    for fi in tqdm(range(len(faces)), desc="Baking texture"):
-        f = faces[fi]
-        a = uv_pix[f[0]].astype(np.float64)
-        b = uv_pix[f[1]].astype(np.float64)
-        c = uv_pix[f[2]].astype(np.float64)
-
-        ca = vcolors[f[0]].astype(np.float64)
-        cb = vcolors[f[1]].astype(np.float64)
-        cc = vcolors[f[2]].astype(np.float64)
-
-        x0, x1, y0, y1 = bbox(a, b, c)
-        for y in range(y0, y1 + 1):
-            for x in range(x0, x1 + 1):
-                p = np.array([x + 0.5, y + 0.5], dtype=np.float64)
-                bc = bary(p, a, b, c)
-                if bc is None:
-                    continue
-                w0, w1, w2 = bc
-                if (w0 >= -1e-6) and (w1 >= -1e-6) and (w2 >= -1e-6):
-                    col = w0 * ca + w1 * cb + w2 * cc
-                    tex[y, x] = np.clip(col, 0, 255).astype(np.uint8)
-                    mask[y, x] = 255
-
-    # hole fill
-    for _ in range(8):
-        holes = (mask == 0)
-        if not holes.any():
-            break
-        padded = np.pad(tex, ((1, 1), (1, 1), (0, 0)), mode="edge")
-        padded_m = np.pad(mask, ((1, 1), (1, 1)), mode="edge")
-        neigh = (
-            padded_m[0:-2,0:-2] + padded_m[0:-2,1:-1] + padded_m[0:-2,2:] +
-            padded_m[1:-1,0:-2] + padded_m[1:-1,1:-1] + padded_m[1:-1,2:] +
-            padded_m[2:,0:-2] + padded_m[2:,1:-1] + padded_m[2:,2:]
-        )
-        has = (neigh > 0) & holes
-        if not has.any():
-            break
-        sum_col = (
-            padded[0:-2,0:-2] + padded[0:-2,1:-1] + padded[0:-2,2:] +
-            padded[1:-1,0:-2] + padded[1:-1,1:-1] + padded[1:-1,2:] +
-            padded[2:,0:-2] + padded[2:,1:-1] + padded[2:,2:]
+    faces = np.asarray(faces)
+    tri = uv_pix[faces]                              # [F,3,2]
+    col = vcolors[faces].astype(np.float64)          # [F,3,3]; gathers through a GatheredView
+
+    # degenerate UV triangles never cover a pixel
+    e0 = tri[:, 1] - tri[:, 0]
+    e1 = tri[:, 2] - tri[:, 0]
+    d00 = (e0 * e0).sum(axis=1)
+    d01 = (e0 * e1).sum(axis=1)
+    d11 = (e1 * e1).sum(axis=1)
+    valid = np.abs(d00 * d11 - d01 * d01) >= 1e-12
+    del e0, e1, d00, d01, d11
+
+    x0, x1, y0, y1 = _face_bboxes(tri, tex_res)
+
+    tiles = list(_tiles(tex_res, tex_res, tile))
+    for ty0, ty1, tx0, tx1 in (tiles if tile_size is None else tqdm(tiles, desc="Baking texture")):
+        sel = np.nonzero(valid & (x0 < tx1) & (x1 >= tx0) & (y0 < ty1) & (y1 >= ty0))[0]
+        if len(sel) == 0:
+            continue
+        if tile_size is None:
+            tt, tm = tex, mask
+        else:
+            tt = np.zeros((ty1 - ty0, tx1 - tx0, 3), dtype=np.uint8)
+            tm = np.zeros((ty1 - ty0, tx1 - tx0), dtype=np.uint8)
+        _raster_region(
+            tt, tm, tx0, ty0, tri[sel], col[sel],
+            np.maximum(x0[sel], tx0), np.minimum(x1[sel], tx1 - 1),
+            np.maximum(y0[sel], ty0), np.minimum(y1[sel], ty1 - 1),
+            max_batch_pixels, progress=tile_size is None,
         )
-        tex[has] = (sum_col[has] / 9.0).astype(np.uint8)
-        mask[has] = 255
+        if tile_size is not None:
+            tex[ty0:ty1, tx0:tx1] = tt
+            mask[ty0:ty1, tx0:tx1] = tm
+
+    if tile_size is None:
+        fill_uv_gutter(tex, mask, gutter=gutter)
+        return tex
 
+    fill_uv_gutter(tex, mask, gutter=gutter, tile=tile, work_dir=work_dir)
+    mask_path = mask.filename
+    del mask
+    os.remove(mask_path)
+    tex.flush()
     return tex
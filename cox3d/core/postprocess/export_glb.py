@@ -0,0 +1,161 @@
+import io
+import json
+import os
+import struct
+
+import numpy as np
+
+from core.engine.mesh import index_dtype
+from core.engine.trace import file_bytes, traced
+from core.postprocess.export_obj import save_texture_png
+
+_ARRAY_BUFFER = 34962
+_ELEMENT_ARRAY_BUFFER = 34963
+_FLOAT = 5126
+_UNSIGNED_SHORT = 5123
+_UNSIGNED_INT = 5125
+
+
+def quantize_unorm16(x: np.ndarray):
+    """
+    Per-axis uint16 quantization: x ~= q * scale + offset.
+    """
+    lo = x.min(axis=0).astype(np.float64)
+    span = x.max(axis=0).astype(np.float64) - lo
+    span[span == 0] = 1.0
+    q = np.rint((x - lo) / span * 65535.0).astype(np.uint16)
+    return q, span / 65535.0, lo
+
+
+def _encode_png(texture, compress_level=None, tex_path=None):
+    if tex_path is not None:
+        with open(tex_path, "rb") as f:
+            return f.read()
+    buf = io.BytesIO()
+    save_texture_png(buf, texture, compress_level)  # a memmap is encoded row band by band
+    return buf.getvalue()
+
+
+@traced("export_glb", "io", sizes=file_bytes)
+def export_glb(out_dir, name, verts, faces, uvs, texture, quantize=False, png_compress_level=None,
+               tex_path=None):
+    """
+    Export a single binary glTF 2.0 (GLB) with the albedo texture embedded.
+
+    - Indices are uint16 when the mesh has <= 65535 vertices, else uint32.
+    - quantize=True stores positions as uint16 (dequantized via the node's
+      scale/translation) and UVs as normalized uint16 (KHR_mesh_quantization).
+    - tex_path: albedo PNG of `texture` already written (e.g. by
+      export_obj_mtl_png); embedded as is instead of encoding it again.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    glb_path = os.path.join(out_dir, f"{name}.glb")
+
+    verts = np.asarray(verts, dtype=np.float32)
+    faces = np.asarray(faces)
+    # glTF texture space has its origin at the top-left (matches the baked image rows)
+    st = np.asarray(uvs, dtype=np.float32).copy()
+    st[:, 1] = 1.0 - st[:, 1]
+
+    idx = faces.astype(index_dtype(len(verts)), copy=False).reshape(-1)
+    node = {"mesh": 0}
+    if quantize:
+        qpos, scale, offset = quantize_unorm16(verts)
+        # pad VEC3 ushort to 8 bytes: vertex attributes must be 4-byte aligned
+        pos = np.zeros((len(verts), 4), dtype=np.uint16)
+        pos[:, :3] = qpos
+        pos_acc = {
+            "componentType": _UNSIGNED_SHORT,
+            "min": qpos.min(axis=0).tolist(), "max": qpos.max(axis=0).tolist(),
+        }
+        pos_stride = 8
+        tex_data = np.rint(np.clip(st, 0.0, 1.0) * 65535.0).astype(np.uint16)
+        uv_acc = {"componentType": _UNSIGNED_SHORT, "normalized": True}
+        node["scale"] = scale.tolist()
+        node["translation"] = offset.tolist()
+    else:
+        pos = verts
+        pos_acc = {
+            "componentType": _FLOAT,
+            "min": verts.min(axis=0).tolist(), "max": verts.max(axis=0).tolist(),
+        }
+        pos_stride = None
+        tex_data = st
+        uv_acc = {"componentType": _FLOAT}
+
+    png = _encode_png(texture, png_compress_level, tex_path)
+
+    blobs, views = [], []
+    offset_bytes = 0
+
+    def add_view(data: bytes, target=None, stride=None):
+        nonlocal offset_bytes
+        view = {"buffer": 0, "byteOffset": offset_bytes, "byteLength": len(data)}
+        if target is not None:
+            view["target"] = target
+        if stride is not None:
+            view["byteStride"] = stride
+        pad = (-len(data)) % 4
+        blobs.append(data + b"\x00" * pad)
+        offset_bytes += len(data) + pad
+        views.append(view)
+        return len(views) - 1
+
+    v_idx = add_view(idx.tobytes(), _ELEMENT_ARRAY_BUFFER)
+    v_pos = add_view(np.ascontiguousarray(pos).tobytes(), _ARRAY_BUFFER, pos_stride)
+    v_uv = add_view(np.ascontiguousarray(tex_data).tobytes(), _ARRAY_BUFFER)
+    v_img = add_view(png)
+
+    accessors = [
+        {
+            "bufferView": v_idx, "count": int(idx.size), "type": "SCALAR",
+            "componentType": _UNSIGNED_SHORT if idx.dtype == np.uint16 else _UNSIGNED_INT,
+        },
+        dict(bufferView=v_pos, count=len(verts), type="VEC3", **pos_acc),
+        dict(bufferView=v_uv, count=len(verts), type="VEC2", **uv_acc),
+    ]
+
+    gltf = {
+        "asset": {"version": "2.0", "generator": "CoX-3D"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [node],
+        "meshes": [{
+            "primitives": [{
+                "attributes": {"POSITION": 1, "TEXCOORD_0": 2},
+                "indices": 0,
+                "material": 0,
+            }],
+        }],
+        "materials": [{
+            "name": "material0",
+            "pbrMetallicRoughness": {
+                "baseColorTexture": {"index": 0},
+                "metallicFactor": 0.0,
+                "roughnessFactor": 1.0,
+            },
+        }],
+        "textures": [{"source": 0, "sampler": 0}],
+        "samplers": [{"magFilter": 9729, "minFilter": 9987, "wrapS": 33071, "wrapT": 33071}],
+        "images": [{"bufferView": v_img, "mimeType": "image/png", "name": f"{name}_albedo"}],
+        "accessors": accessors,
+        "bufferViews": views,
+        "buffers": [{"byteLength": offset_bytes}],
+    }
+    if quantize:
+        gltf["extensionsUsed"] = ["KHR_mesh_quantization"]
+        gltf["extensionsRequired"] = ["KHR_mesh_quantization"]
+
+    js = json.dumps(gltf, separators=(",", ":")).encode("utf-8")
+    js += b" " * ((-len(js)) % 4)
+    total = 12 + 8 + len(js) + 8 + offset_bytes
+
+    with open(glb_path, "wb") as f:
+        f.write(struct.pack("<III", 0x46546C67, 2, total))
+        f.write(struct.pack("<II", len(js), 0x4E4F534A))
+        f.write(js)
+        f.write(struct.pack("<II", offset_bytes, 0x004E4942))
+        for b in blobs:
+            f.write(b)
+
+    return glb_path
@@ -1,35 +1,124 @@
 import os
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 from PIL import Image
 
-def export_obj_mtl_png(out_dir, name, verts, faces, uvs, texture):
+from core.engine.trace import file_bytes, traced
+
+
+def _png_chunk(tag: bytes, data: bytes):
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+
+def save_png_rows(path, texture, rows=256, level=6):
+    """
+    Write an RGB uint8 image as PNG band by band (filter 0, streamed zlib), so a
+    memory-mapped 8K/16K texture is never loaded into RAM as a whole.
+    `path` may also be a binary file object.
+    """
+    if not isinstance(path, (str, os.PathLike)):
+        return _write_png_rows(path, texture, rows, level)
+    with open(path, "wb") as f:
+        _write_png_rows(f, texture, rows, level)
+
+
+def _write_png_rows(f, texture, rows, level):
+    h, w = texture.shape[:2]
+    comp = zlib.compressobj(level)
+    f.write(b"\x89PNG\r\n\x1a\n")
+    f.write(_png_chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0)))
+    for y in range(0, h, rows):
+        band = np.asarray(texture[y:y + rows], dtype=np.uint8).reshape(-1, w * 3)
+        raw = np.zeros((band.shape[0], w * 3 + 1), dtype=np.uint8)
+        raw[:, 1:] = band
+        data = comp.compress(raw.tobytes())
+        if data:
+            f.write(_png_chunk(b"IDAT", data))
+    f.write(_png_chunk(b"IDAT", comp.flush()))
+    f.write(_png_chunk(b"IEND", b""))
+
+
+def save_texture_png(path, texture, compress_level=None):
+    """
+    Write the baked albedo as PNG (`path`: file path or binary file object).
+    A memory-mapped (out-of-core) texture is streamed by rows instead of
+    being materialized; compress_level None keeps the encoder default (6).
+    """
+    if isinstance(texture, np.memmap):
+        save_png_rows(path, texture, level=6 if compress_level is None else int(compress_level))
+    else:
+        kwargs = {} if compress_level is None else {"compress_level": int(compress_level)}
+        Image.fromarray(texture).save(path, format="PNG", **kwargs)
+
+
+def _write_rows(f, fmt, rows, chunk_rows):
+    """
+    Format a 2D array block by block with one %-format per chunk (C-level
+    formatting, one large write per chunk) instead of one f-string per row.
+    Output is byte-identical to per-row f"{x:.6f}" / f"{i}" formatting.
+    """
+    for s in range(0, len(rows), chunk_rows):
+        block = rows[s:s + chunk_rows]
+        f.write((fmt * len(block)) % tuple(block.ravel().tolist()))
+
+
+@traced("export_obj", "io", sizes=file_bytes)
+def export_obj_mtl_png(
+    out_dir,
+    name,
+    verts,
+    faces,
+    uvs,
+    texture,
+    png_compress_level=None,
+    png_async=False,
+    chunk_rows=65536,
+):
+    """
+    Write OBJ + MTL + albedo PNG.
+
+    png_compress_level: zlib level 0-9 for the PNG (None keeps Pillow's default).
+    png_async: encode the PNG in a background thread while the OBJ is written
+    (zlib releases the GIL); it is waited for before returning, and a failure
+    there is raised here.
+    """
     os.makedirs(out_dir, exist_ok=True)
     tex_path = os.path.join(out_dir, f"{name}_albedo.png")
     mtl_path = os.path.join(out_dir, f"{name}.mtl")
     obj_path = os.path.join(out_dir, f"{name}.obj")
 
-    Image.fromarray(texture).save(tex_path)
-
-    with open(mtl_path, "w", encoding="utf-8") as f:
-        f.write("newmtl material0\n")
-        f.write("Ka 1.000 1.000 1.000\n")
-        f.write("Kd 1.000 1.000 1.000\n")
-        f.write("Ks 0.000 0.000 0.000\n")
-        f.write("Ns 10.000\n")
-        f.write("d 1.0\n")
-        f.write(f"map_Kd {os.path.basename(tex_path)}\n")
+    save_png = lambda: save_texture_png(tex_path, texture, png_compress_level)
 
-    with open(obj_path, "w", encoding="utf-8") as f:
-        f.write(f"mtllib {os.path.basename(mtl_path)}\n")
-        f.write("usemtl material0\n")
+    def write_obj():
+        with open(mtl_path, "w", encoding="utf-8") as f:
+            f.write("newmtl material0\n")
+            f.write("Ka 1.000 1.000 1.000\n")
+            f.write("Kd 1.000 1.000 1.000\n")
+            f.write("Ks 0.000 0.000 0.000\n")
+            f.write("Ns 10.000\n")
+            f.write("d 1.0\n")
+            f.write(f"map_Kd {os.path.basename(tex_path)}\n")
 
-        for v in verts:
-            f.write(f"v {v[0]:.6f} {v[1]:.6f} {v[2]:.6f}\n")
+        faces1 = np.asarray(faces, dtype=np.int64) + 1
+        with open(obj_path, "w", encoding="utf-8") as f:
+            f.write(f"mtllib {os.path.basename(mtl_path)}\n")
+            f.write("usemtl material0\n")
 
-        for vt in uvs:
-            f.write(f"vt {vt[0]:.6f} {vt[1]:.6f}\n")
+            # chunk by chunk, so a GatheredView of verts is never materialized whole
+            _write_rows(f, "v %.6f %.6f %.6f\n", verts, chunk_rows)
+            _write_rows(f, "vt %.6f %.6f\n", np.asarray(uvs)[:, :2], chunk_rows)
+            _write_rows(f, "f %d/%d %d/%d %d/%d\n", np.repeat(faces1[:, :3], 2, axis=1), chunk_rows)
 
-        for tri in faces:
-            a, b, c = tri
-            f.write(f"f {a+1}/{a+1} {b+1}/{b+1} {c+1}/{c+1}\n")
+    if png_async:
+        with ThreadPoolExecutor(1, thread_name_prefix=f"{name}_png") as pool:
+            png = pool.submit(save_png)
+            write_obj()
+            png.result()  # re-raises a failed PNG write
+    else:
+        save_png()
+        write_obj()
 
     return obj_path
@@ -0,0 +1,56 @@
+import os
+
+import numpy as np
+
+from core.engine.mesh import index_dtype
+from core.engine.trace import file_bytes, traced
+from core.postprocess.export_obj import save_texture_png
+
+
+@traced("export_ply", "io", sizes=file_bytes)
+def export_ply(out_dir, name, verts, faces, uvs, texture, png_compress_level=None, tex_path=None):
+    """
+    Export a binary little-endian PLY (float32 xyz + per-vertex s/t) next to the
+    albedo PNG, referenced MeshLab-style via a `TextureFile` comment.
+    Face indices use uint16 or uint32 depending on the vertex count.
+
+    tex_path: albedo PNG of `texture` already written in `out_dir` (e.g. by
+    export_obj_mtl_png); referenced instead of encoding the texture again.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    ply_path = os.path.join(out_dir, f"{name}.ply")
+    if tex_path is None:
+        tex_path = os.path.join(out_dir, f"{name}_albedo.png")
+        save_texture_png(tex_path, texture, png_compress_level)
+
+    faces = np.asarray(faces)
+    idt = index_dtype(len(verts))
+
+    vdata = np.empty(len(verts), dtype=[("xyz", "<f4", 3), ("st", "<f4", 2)])
+    vdata["xyz"] = verts
+    vdata["st"] = uvs
+    fdata = np.empty(len(faces), dtype=[("n", "u1"), ("idx", np.dtype(idt).newbyteorder("<"), 3)])
+    fdata["n"] = 3
+    fdata["idx"] = faces
+
+    header = (
+        "ply\n"
+        "format binary_little_endian 1.0\n"
+        f"comment TextureFile {os.path.basename(tex_path)}\n"
+        f"element vertex {len(verts)}\n"
+        "property float x\n"
+        "property float y\n"
+        "property float z\n"
+        "property float s\n"
+        "property float t\n"
+        f"element face {len(faces)}\n"
+        f"property list uchar {'ushort' if idt == np.uint16 else 'uint'} vertex_indices\n"
+        "end_header\n"
+    )
+
+    with open(ply_path, "wb") as f:
+        f.write(header.encode("ascii"))
+        f.write(vdata.tobytes())
+        f.write(fdata.tobytes())
+
+    return ply_path
@@ -0,0 +1,364 @@
+import warnings
+
+import numpy as np
+
+from core.engine.mesh import index_dtype
+from core.engine.trace import traced
+from core.postprocess.bake_texture import _ranges
+
+_BIG = np.iinfo(np.int64).max
+
+
+def _cast_colors(col, dtype):
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        return np.clip(np.rint(col), info.min, info.max).astype(dtype)
+    return col.astype(dtype)
+
+
+def _compact(verts, faces, vcolors):
+    """
+    Drop unreferenced vertices and renumber faces.
+    """
+    used = np.zeros(len(verts), dtype=bool)
+    used[faces.ravel()] = True
+    remap = np.cumsum(used) - 1
+    faces = remap[faces]
+    return verts[used], faces, None if vcolors is None else vcolors[used]
+
+
+def _drop_degenerate(faces):
+    """
+    Remove faces with a repeated vertex and repeated faces (same vertex set,
+    first occurrence kept in order).
+    """
+    ok = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])
+    faces = faces[ok]
+    _, first = np.unique(np.sort(faces, axis=1), axis=0, return_index=True)
+    return faces[np.sort(first)]
+
+
+@traced("weld", "postprocess", sizes=lambda r: {"verts_out": len(r[0]), "faces_out": len(r[1])})
+def weld_vertices(verts: np.ndarray, faces: np.ndarray, vcolors: np.ndarray = None, tol: float = 1e-6):
+    """
+    Merge vertices that snap to the same cell of a `tol`-sized grid (e.g. the
+    per-face duplicates of a marching-cubes mesh), averaging their colors,
+    and drop faces that become degenerate or repeated.
+
+    Returns:
+      verts [V',3], faces [F',3] (uint16/uint32, see `index_dtype`),
+      vcolors [V',C] (None if not given)
+    """
+    if len(verts) == 0:
+        return verts, faces, vcolors
+    key = np.round(np.asarray(verts, dtype=np.float64) / tol).astype(np.int64)
+    _, first, inverse = np.unique(key, axis=0, return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+    new_verts = verts[first]
+
+    new_colors = None
+    if vcolors is not None:
+        cnt = np.bincount(inverse, minlength=len(first)).astype(np.float64)
+        col = np.stack([
+            np.bincount(inverse, weights=vcolors[:, c].astype(np.float64), minlength=len(first))
+            for c in range(vcolors.shape[1])
+        ], axis=1) / cnt[:, None]
+        new_colors = _cast_colors(col, vcolors.dtype)
+
+    new_faces = _drop_degenerate(inverse[np.asarray(faces, dtype=np.int64)])
+    new_verts, new_faces, new_colors = _compact(new_verts, new_faces, new_colors)
+    return new_verts, new_faces.astype(index_dtype(len(new_verts))), new_colors
+
+
+def _edges(faces, n):
+    """
+    Unique undirected edges (lo, hi) with the number of faces sharing each.
+    """
+    he = faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+    key = np.minimum(he[:, 0], he[:, 1]) * n + np.maximum(he[:, 0], he[:, 1])
+    uk, inv, cnt = np.unique(key, return_inverse=True, return_counts=True)
+    return uk // n, uk % n, cnt, inv.ravel()
+
+
+def _scatter(idx, q, n):
+    # per-vertex sum of [K,4,4] quadrics
+    flat = q.reshape(len(q), 16)
+    return np.stack([np.bincount(idx, weights=flat[:, j], minlength=n) for j in range(16)], axis=1).reshape(n, 4, 4)
+
+
+def _plane_quadrics(normals, points, weight=1.0):
+    p = np.concatenate([normals, -np.einsum("ki,ki->k", normals, points)[:, None]], axis=1)
+    return weight * p[:, :, None] * p[:, None, :]
+
+
+def _initial_quadrics(pos, faces, boundary_weight):
+    """
+    Garland-Heckbert vertex quadrics: sum of the planes of incident faces,
+    plus heavily weighted planes perpendicular to boundary edges so open
+    borders do not shrink.
+    """
+    n = len(pos)
+    tri = pos[faces]
+    nrm = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    length = np.linalg.norm(nrm, axis=1, keepdims=True)
+    nrm = np.divide(nrm, length, out=np.zeros_like(nrm), where=length > 0)
+    kf = _plane_quadrics(nrm, tri[:, 0])
+    Q = _scatter(faces.ravel(), np.repeat(kf, 3, axis=0), n)
+
+    lo, hi, cnt, inv = _edges(faces, n)
+    he = np.flatnonzero(cnt[inv] == 1)
+    if len(he):
+        f = he // 3
+        a = faces[f, he % 3]
+        b = faces[f, (he % 3 + 1) % 3]
+        m = np.cross(pos[b] - pos[a], nrm[f])
+        length = np.linalg.norm(m, axis=1, keepdims=True)
+        m = np.divide(m, length, out=np.zeros_like(m), where=length > 0)
+        kb = _plane_quadrics(m, pos[a], boundary_weight)
+        Q += _scatter(np.concatenate([a, b]), np.concatenate([kb, kb]), n)
+    return Q
+
+
+def _quadric_cost(Q, x):
+    xh = np.concatenate([x, np.ones((len(x), 1))], axis=1)
+    return np.maximum(np.einsum("ki,kij,kj->k", xh, Q, xh), 0.0)
+
+
+def _optimal_positions(Q, pa, pb):
+    """
+    Position minimizing the edge quadric Q: the solution of the 3x3 system
+    when well conditioned and close to the edge, else the best of the two
+    endpoints and the midpoint.
+
+    Returns:
+      x [M,3], cost [M]
+    """
+    mid = 0.5 * (pa + pb)
+    cands = np.stack([pa, pb, mid], axis=0)
+    costs = np.stack([_quadric_cost(Q, c) for c in cands], axis=0)
+    best = np.argmin(costs, axis=0)
+    rows = np.arange(len(Q))
+    x, cost = cands[best, rows], costs[best, rows]
+
+    A = Q[:, :3, :3]
+    tr = np.einsum("kii->k", A)
+    ok = np.abs(np.linalg.det(A)) > 1e-9 * tr ** 3
+    if ok.any():
+        xs = np.linalg.solve(A[ok], -Q[ok, :3, 3][..., None])[..., 0]
+        near = np.linalg.norm(xs - mid[ok], axis=1) <= np.linalg.norm(pb[ok] - pa[ok], axis=1)
+        cs = _quadric_cost(Q[ok], xs)
+        better = near & (cs < cost[ok])
+        idx = np.flatnonzero(ok)[better]
+        x[idx], cost[idx] = xs[better], cs[better]
+    return x, cost
+
+
+def _link_ok(a, b, nf, lo, hi, n):
+    """
+    Link condition for collapsing edges (a, b): the endpoints share exactly
+    as many neighbors as the edge has faces, so the collapse keeps the
+    surface manifold.
+    """
+    src = np.concatenate([lo, hi])
+    dst = np.concatenate([hi, lo])
+    order = np.argsort(src, kind="stable")
+    dst = dst[order]
+    deg = np.bincount(src, minlength=n)
+    start = np.cumsum(deg) - deg
+
+    ends = np.concatenate([a, b])
+    sid = np.tile(np.arange(len(a)), 2)
+    cnt = deg[ends]
+    nbr = dst[np.repeat(start[ends], cnt) + _ranges(cnt)]
+    key = np.repeat(sid, cnt) * n + nbr
+    uk, c = np.unique(key, return_counts=True)
+    common = np.bincount(uk[c == 2] // n, minlength=len(a))
+    return common == nf
+
+
+def _tri_normals(tri):
+    return np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+
+
+def _independent_edges(ea, eb, faces, n, passes=3):
+    """
+    Greedy parallel matching over cost-sorted edges: an edge is taken when it
+    is the cheapest within its 2-ring, then faces around taken edges are
+    locked and the rest gets another pass. No face ends up touching the
+    endpoints of two taken edges.
+
+    Returns:
+      positions (into ea/eb) of the taken edges
+    """
+    rank = np.arange(len(ea), dtype=np.int64)
+    live = np.ones(len(ea), dtype=bool)
+    locked = np.zeros(n, dtype=bool)
+    taken = []
+    for _ in range(passes):
+        r = rank[live]
+        vmin = np.full(n, _BIG, dtype=np.int64)
+        np.minimum.at(vmin, ea[r], r)
+        np.minimum.at(vmin, eb[r], r)
+        vmin[locked] = -1
+        fmin = vmin[faces].min(axis=1)
+        vmin2 = np.full(n, _BIG, dtype=np.int64)
+        np.minimum.at(vmin2, faces.ravel(), np.repeat(fmin, 3))
+        t = r[(vmin2[ea[r]] == r) & (vmin2[eb[r]] == r)]
+        if not len(t):
+            break
+        taken.append(t)
+        ends = np.zeros(n, dtype=bool)
+        ends[ea[t]] = ends[eb[t]] = True
+        locked[faces[ends[faces].any(axis=1)].ravel()] = True
+        live &= ~(locked[ea] | locked[eb])
+        if not live.any():
+            break
+    return np.sort(np.concatenate(taken)) if taken else rank[:0]
+
+
+@traced("decimate", "postprocess", sizes=lambda r: {"verts_out": len(r[0]), "faces_out": len(r[1])})
+def decimate_qem(
+    verts: np.ndarray,
+    faces: np.ndarray,
+    vcolors: np.ndarray = None,
+    target_faces: int = None,
+    max_error: float = None,
+    boundary_weight: float = 1e3,
+    max_iters: int = 500,
+):
+    """
+    Quadric error metric edge-collapse decimation (Garland & Heckbert),
+    vectorized over batches of independent collapses.
+
+    Each round scores every edge by its quadric error at the optimal
+    collapse position and collapses, in parallel, every edge that is the
+    cheapest within its 2-ring (so no face is touched by two collapses).
+    Collapses that would break manifoldness (link condition), flip a face or
+    leave a zero-area one are skipped until a neighboring vertex changes.
+    Cost ties (e.g. flat regions) go to the shorter edge, then by a hash of
+    the edge, so equal edges spread over the mesh instead of serializing.
+    Vertex colors are interpolated along the collapsed edge. Stops at
+    `target_faces`, or when no edge is within `max_error` (approximate
+    distance to the original surface, in mesh units); a RuntimeWarning is
+    issued if it runs out of valid collapses (or `max_iters`) before either.
+
+    Returns:
+      verts [V',3] float32, faces [F',3] uint16/uint32, vcolors [V',C] (None if not given)
+    """
+    if target_faces is None and max_error is None:
+        return verts, faces, vcolors
+    pos = np.asarray(verts, dtype=np.float64)
+    col = None if vcolors is None else np.asarray(vcolors, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64)
+    n = len(pos)
+    target = 0 if target_faces is None else int(target_faces)
+    max_cost = np.inf if max_error is None else float(max_error) ** 2
+
+    Q = _initial_quadrics(pos, faces, boundary_weight)
+    blocked = np.zeros(0, dtype=np.int64)  # edges whose collapse was rejected, until a neighbor changes
+    flipped = degenerate = 0                # rejected collapses, for the warning
+    done = False  # stopped at target_faces / max_error (not for lack of valid collapses)
+    dirty = np.ones(n, dtype=bool)          # vertices moved / merged in the last round
+    keys, ex, ecost = np.zeros(0, dtype=np.int64), np.zeros((0, 3)), np.zeros(0)
+    for _ in range(max_iters):
+        if len(faces) <= target:
+            done = True
+            break
+        lo, hi, nf, _ = _edges(faces, n)
+        key = lo * n + hi
+
+        # an edge's collapse only changes when one of its endpoints did
+        stale = dirty[lo] | dirty[hi]
+        x, cost = np.empty((len(key), 3)), np.empty(len(key))
+        old = np.flatnonzero(~stale)
+        j = np.searchsorted(keys, key[old])
+        x[old], cost[old] = ex[j], ecost[j]
+        new = np.flatnonzero(stale)
+        x[new], cost[new] = _optimal_positions(Q[lo[new]] + Q[hi[new]], pos[lo[new]], pos[hi[new]])
+        keys, ex, ecost = key, x, cost
+        dirty[:] = False
+
+        boundary = np.zeros(n, dtype=bool)
+        boundary[lo[nf == 1]] = True
+        boundary[hi[nf == 1]] = True
+        # no non-manifold edges, and no interior edge pinching two borders
+        ok = (nf <= 2) & ~((nf == 2) & boundary[lo] & boundary[hi]) & (cost <= max_cost)
+        done = not ok.any()  # every remaining edge exceeds max_error
+        if len(blocked):
+            ok &= ~np.isin(key, blocked)
+        cand = np.flatnonzero(ok)
+        x, cost = x[cand], cost[cand]
+        if not len(cand):
+            break
+
+        # only the cheapest edges that are still needed, each cheapest in its 2-ring.
+        # Cost ties (flat regions) go shortest edge first, then in a hashed rather
+        # than index order: else only one edge per run of ties wins its 2-ring per round
+        d = pos[hi[cand]] - pos[lo[cand]]
+        jitter = ((key[cand].astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(40)) * 1e-10
+        order = np.argsort(cost + 1j * (np.einsum("ki,ki->k", d, d) * (1.0 + jitter)), kind="stable")
+        order = order[: (len(faces) - target + 1) // 2 if target else None]
+        sel = order[_independent_edges(lo[cand[order]], hi[cand[order]], faces, n)]
+        a, b, xs = lo[cand[sel]], hi[cand[sel]], x[sel]
+
+        link = _link_ok(a, b, nf[cand[sel]], lo, hi, n)
+
+        # face flips / zero-area faces, with every linked collapse applied
+        cid = np.full(n, -1, dtype=np.int64)
+        cid[a[link]] = np.flatnonzero(link)
+        cid[b[link]] = np.flatnonzero(link)
+        fc = cid[faces].max(axis=1)
+        t = np.flatnonzero(fc >= 0)
+        ft = faces[t]
+        moved = pos.copy()
+        moved[a[link]] = xs[link]
+        moved[b[link]] = xs[link]
+        removed = (ft == a[fc[t], None]).any(axis=1) & (ft == b[fc[t], None]).any(axis=1)
+        n0, n1 = _tri_normals(pos[ft]), _tri_normals(moved[ft])
+        e = moved[ft] - moved[ft][:, [1, 2, 0]]
+        # collinear corners (e.g. on a flat grid) give a ~0 normal: not a flip, but still invalid
+        degen = ~removed & (np.linalg.norm(n1, axis=1) <= 1e-6 * np.einsum("kji,kji->k", e, e))
+        flip = ~removed & ~degen & (np.einsum("ki,ki->k", n0, n1) <= 0)
+        accept = link.copy()
+        accept[fc[t][flip | degen]] = False
+        is_flip = np.zeros(len(a), dtype=bool)
+        is_flip[fc[t][flip]] = True
+        flipped += int(is_flip.sum())
+        degenerate += int((~accept & link & ~is_flip).sum())
+
+        rejected = a[~accept] * n + b[~accept]
+        a, b, xs = a[accept], b[accept], xs[accept]
+        if not len(a):
+            blocked = np.concatenate([blocked, rejected])
+            continue
+
+        if col is not None:
+            d = pos[b] - pos[a]
+            w = np.clip(np.einsum("ki,ki->k", xs - pos[a], d) / np.maximum(np.einsum("ki,ki->k", d, d), 1e-30), 0, 1)
+            col[a] = (1 - w)[:, None] * col[a] + w[:, None] * col[b]
+        Q[a] += Q[b]
+        pos[a] = xs
+        dirty[a] = True
+        remap = np.arange(n)
+        remap[b] = a
+        faces = remap[faces]
+        faces = faces[(faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])]
+
+        # rejected edges around a collapse may be valid now: retry them
+        near = np.zeros(n, dtype=bool)
+        near[faces[dirty[faces].any(axis=1)].ravel()] = True
+        blocked = blocked[~(near[blocked // n] | near[blocked % n])]
+        blocked = np.concatenate([blocked, rejected])
+
+    if not done and len(faces) > target:
+        warnings.warn(
+            f"decimate_qem stopped at {len(faces)} faces before target_faces={target_faces} / "
+            f"max_error={max_error} (no valid collapse left or max_iters={max_iters}); "
+            f"collapses rejected: {flipped} face flips, {degenerate} zero-area faces",
+            RuntimeWarning,
+        )
+
+    new_verts, new_faces, new_colors = _compact(pos, faces, col)
+    if new_colors is not None:
+        new_colors = _cast_colors(new_colors, vcolors.dtype)
+    return new_verts.astype(np.float32), new_faces.astype(index_dtype(len(new_verts))), new_colors
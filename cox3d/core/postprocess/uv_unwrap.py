@@ -1,15 +1,115 @@
+import hashlib
+import importlib.metadata
+import json
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 import xatlas
 
-def unwrap_uv_xatlas(verts: np.ndarray, faces: np.ndarray):
+from core.engine.mesh import GatheredView, index_dtype
+from core.engine.trace import annotate, traced
+
+# xatlas options exposed for speed/quality trade-offs (None keeps xatlas' default)
+PACK_OPTIONS = {"resolution": "resolution", "padding": "padding", "brute_force": "bruteForce",
+                "texels_per_unit": "texels_per_unit", "rotate_charts": "rotate_charts"}
+CHART_OPTIONS = {"max_iterations": "max_iterations", "max_cost": "max_cost",
+                 "max_chart_area": "max_chart_area"}
+
+
+def _options(options):
+    options = {k: v for k, v in (options or {}).items() if v is not None}
+    for k in options:
+        if k not in PACK_OPTIONS and k not in CHART_OPTIONS:
+            raise ValueError(f"Unknown unwrap option: {k}")
+    return options
+
+
+def unwrap_key(verts: np.ndarray, faces: np.ndarray, options=None):
+    """
+    Content hash of the vertex/face buffers, unwrap options and xatlas version.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for a in (np.ascontiguousarray(verts, dtype=np.float32), np.ascontiguousarray(faces, dtype=np.uint32)):
+        h.update(str(a.shape).encode("utf-8"))
+        h.update(a.tobytes())
+    h.update(json.dumps(_options(options), sort_keys=True).encode("utf-8"))
+    h.update(importlib.metadata.version("xatlas").encode("utf-8"))
+    return "uv-" + h.hexdigest()
+
+
+def _parametrize(verts, faces, options):
+    verts = np.ascontiguousarray(verts, dtype=np.float32)
+    faces = np.ascontiguousarray(faces, dtype=np.uint32)
+    if not options:
+        return xatlas.parametrize(verts, faces)
+    chart, pack = xatlas.ChartOptions(), xatlas.PackOptions()
+    for k, v in options.items():
+        if k in PACK_OPTIONS:
+            setattr(pack, PACK_OPTIONS[k], v)
+        else:
+            setattr(chart, CHART_OPTIONS[k], v)
+    atlas = xatlas.Atlas()
+    atlas.add_mesh(verts, faces)
+    atlas.generate(chart_options=chart, pack_options=pack)
+    return atlas.get_mesh(0)
+
+
+@traced("unwrap", "postprocess", sizes=lambda r: {"verts_out": len(r[0]), "faces_out": len(r[1])})
+def unwrap_uv_xatlas(verts: np.ndarray, faces: np.ndarray, options=None, cache=None):
     """
     UV unwrapping using xatlas.
 
+    options: xatlas chart/pack settings (see PACK_OPTIONS / CHART_OPTIONS,
+    e.g. {"resolution": 1024, "padding": 2, "brute_force": False}); None or
+    empty uses `xatlas.parametrize` defaults.
+    cache: optional AssetCache; the parametrization is stored under a hash
+    of the geometry and options, so re-baking the same mesh (e.g. at another
+    tex_res) skips xatlas.
+
+    Returns:
+      new_verts [V',3] (a GatheredView of `verts` through vmapping),
+      new_faces [F,3] uint16/uint32, uvs [V',2] float32,
+      vmapping [V'] -> old vertex index
+    """
+    options = _options(options)
+    hit = None
+    if cache is not None:
+        key = unwrap_key(verts, faces, options)
+        hit = cache.get_arrays(key, "uv")
+        annotate(cache_hit=hit is not None)
+    if hit is not None:
+        vmapping, indices, uvs = hit["vmapping"], hit["indices"], hit["uvs"]
+    else:
+        vmapping, indices, uvs = _parametrize(verts, faces, options)
+        if cache is not None:
+            cache.put_arrays(key, "uv", dict(vmapping=vmapping, indices=indices, uvs=uvs))
+    new_faces = indices.astype(index_dtype(len(vmapping)))
+    uvs = uvs.astype(np.float32, copy=False)
+    return GatheredView(verts, vmapping), new_faces, uvs, vmapping
+
+
+def _unwrap_job(verts, faces, options, cache):
+    return unwrap_uv_xatlas(verts, faces, options=options, cache=cache)
+
+
+def unwrap_many(meshes, options=None, cache=None, workers=None):
+    """
+    Unwrap several (verts, faces) meshes in a process pool (`workers`
+    processes, default one per CPU; 0 runs them here). A mesh whose worker
+    fails is returned as the exception instead of a result.
+
     Returns:
-      new_verts [V',3], new_faces [F,3], uvs [V',2], vmapping [V'] -> old vertex index
+      list of unwrap_uv_xatlas results (or exceptions), in input order
     """
-    vmapping, indices, uvs = xatlas.parametrize(verts, faces)
-    new_verts = verts[vmapping]
-    new_faces = indices.astype(np.int32)
-    uvs = uvs.astype(np.float32)
-    return new_verts, new_faces, uvs, vmapping
+    if workers == 0:
+        out = []
+        for verts, faces in meshes:
+            try:
+                out.append(unwrap_uv_xatlas(verts, faces, options=options, cache=cache))
+            except Exception as e:
+                out.append(e)
+        return out
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")) as pool:
+        futs = [pool.submit(_unwrap_job, verts, faces, options, cache) for verts, faces in meshes]
+        return [f.exception() or f.result() for f in futs]
@@ -1,5 +1,11 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
 import torch
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
+
+from core.datasets.columnar import NO_TIME, to_epoch_us
+from core.semantics.term_matcher import TermMatcher, load_lexicon
 
 try:
     from bertopic import BERTopic
@@ -18,6 +24,22 @@ class ELLM(torch.nn.Module):
     llm_filter:
     - 'heuristic': rule-based relevance scoring (no API)
     - 'openai': placeholder hook for GPT-4o topic-level filtering
+
+    embedding_store: optional EmbeddingStore; texts already embedded by the
+    same encoder are read back instead of re-encoded.
+
+    incremental=True: topics are updated with MiniBatchKMeans.partial_fit over
+    timestamp-ordered chunks of `chunk_size` posts and persist across calls, so
+    each call only pays for the new posts (BERTopic is not used in this mode).
+    Design-relevance scores are also accumulated per time window of
+    `window_seconds`; see `window_p` / `sliding_p`. `assign` maps posts to the
+    existing topics without refitting.
+
+    design_terms: relevance lexicon for the heuristic filter (see
+    term_matcher.load_lexicon: list, {term: weight} or file path; default:
+    built-in terms). All texts are scored with `TermMatcher` (substring tests
+    for small lexicons, one Aho-Corasick pass for large ones) and aggregated
+    per topic with one bincount.
     """
 
     def __init__(
@@ -28,6 +50,11 @@ class ELLM(torch.nn.Module):
         llm_filter="heuristic",
         lambda_kl=0.5,
         device="cuda",
+        embedding_store=None,
+        incremental=False,
+        window_seconds=86400,
+        chunk_size=1024,
+        design_terms=None,
     ):
         super().__init__()
         self.text_encoder = text_encoder
@@ -36,58 +63,164 @@ class ELLM(torch.nn.Module):
         self.llm_filter = llm_filter
         self.lambda_kl = float(lambda_kl)
         self.device = device if torch.cuda.is_available() else "cpu"
-
-        if self.use_bertopic:
+        self.embedding_store = embedding_store
+        self.incremental = bool(incremental)
+        self.window_seconds = int(window_seconds)
+        self.chunk_size = int(chunk_size)
+
+        if self.incremental:
+            self.use_bertopic = False
+            self.kmeans = MiniBatchKMeans(
+                n_clusters=self.topic_k, random_state=0, batch_size=self.chunk_size
+            )
+            self._fitted = False
+            self._pending = None  # first posts, held until >= topic_k are seen
+            self.window_scores = {}  # window index -> per-topic relevance score
+        elif self.use_bertopic:
             self.topic_model = BERTopic()
         else:
             self.kmeans = KMeans(n_clusters=self.topic_k, random_state=0)
 
-        self.design_terms = [
-            "造型","材质","颜色","纹理","工艺","比例","曲线","极简","复古","未来感",
-            "金属","透明","灯带","圆角","手感","质感","结构","细节","风格"
-        ]
+        self.design_terms, self.term_weights = load_lexicon(design_terms)
+        self.term_matcher = TermMatcher(self.design_terms, self.term_weights)
 
     def _kl(self, p: torch.Tensor, q: torch.Tensor):
         p = torch.clamp(p, 1e-8, 1.0)
         q = torch.clamp(q, 1e-8, 1.0)
         return torch.sum(p * torch.log(p / q), dim=-1).mean()
 
-    def _heuristic_semantic_judgement(self, texts, topic_ids):
-        K = self.topic_k
-        score = torch.zeros(K, device=self.device)
-        for t, k in zip(texts, topic_ids):
-            s = 0.0
-            for term in self.design_terms:
-                if term in t:
-                    s += 1.0
-            score[int(k)] += s
+    def _aggregate_scores(self, text_scores, topic_ids):
+        # negative ids (BERTopic outliers) wrap around like tensor indexing
+        ids = np.asarray(topic_ids, dtype=np.int64) % self.topic_k
+        score = np.bincount(ids, weights=text_scores, minlength=self.topic_k)
+        return torch.from_numpy(score.astype(np.float32)).to(self.device)
 
+    def _topic_scores(self, texts, topic_ids):
+        return self._aggregate_scores(self.term_matcher.score(texts), topic_ids)
+
+    def _scores_to_pq(self, score):
+        K = self.topic_k
         p = score + 1e-3
         p = p / p.sum()
         q = torch.ones_like(p) / K
         return p, q
 
+    def _heuristic_semantic_judgement(self, texts, topic_ids):
+        return self._scores_to_pq(self._topic_scores(texts, topic_ids))
+
     def _topics_to_prompt(self, texts, topic_ids):
         prompts = []
         for t, k in zip(texts, topic_ids):
             prompts.append(f"product design concept: {t}")
         return prompts
 
+    def _embed(self, texts):
+        if self.embedding_store is not None:
+            h = self.embedding_store.encode(list(texts), self.text_encoder)
+            return torch.from_numpy(h).to(self.device)  # [N,768]
+        return self.text_encoder(texts)  # [N,768]
+
+    def _partial_fit(self, x, w):
+        """
+        Feed embeddings (already in time order) and their sample weights to
+        MiniBatchKMeans chunk by chunk.
+        """
+        for s in range(0, len(x), self.chunk_size):
+            chunk, cw = x[s:s + self.chunk_size], w[s:s + self.chunk_size]
+            if self._pending is not None:
+                chunk = np.concatenate([self._pending[0], chunk], axis=0)
+                cw = np.concatenate([self._pending[1], cw])
+                self._pending = None
+            if not self._fitted and len(chunk) < self.topic_k:
+                self._pending = (chunk, cw)
+                continue
+            self.kmeans.partial_fit(chunk, sample_weight=cw)
+            self._fitted = True
+
+    def _predict(self, x):
+        if self._fitted:
+            return self.kmeans.predict(x).tolist()
+        # fewer than topic_k posts seen so far: every post is its own topic
+        return [i % self.topic_k for i in range(len(x))]
+
     @torch.no_grad()
-    def forward(self, texts, timestamps):
-        h = self.text_encoder(texts)  # [N,768]
+    def assign(self, texts):
+        """
+        Topic ids of new posts under the current (incremental) topic model.
+        """
+        return self._predict(self._embed(texts).cpu().numpy())
+
+    def window_start(self, w: int):
+        return datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(seconds=int(w) * self.window_seconds)
+
+    def window_p(self, w: int):
+        return self._scores_to_pq(self.window_scores[w])[0]
+
+    def sliding_p(self, num_windows: int, end: int = None):
+        """
+        Topic distribution p over the last `num_windows` windows up to window
+        index `end` (default: the latest window seen).
+        """
+        if not self.window_scores:
+            return None
+        end = max(self.window_scores) if end is None else int(end)
+        score = torch.zeros(self.topic_k, device=self.device)
+        for w in range(end - int(num_windows) + 1, end + 1):
+            if w in self.window_scores:
+                score += self.window_scores[w]
+        return self._scores_to_pq(score)[0]
+
+    def _update_windows(self, text_scores, topic_ids, us):
+        """
+        Accumulate relevance scores into the time windows these posts fall in.
+        Returns {window start: p} for every touched window.
+        """
+        win = np.where(us == NO_TIME, NO_TIME, us // (self.window_seconds * 1_000_000))
+        topic_ids = np.asarray(topic_ids, dtype=np.int64)
+        touched = {}
+        for w in np.unique(win[win != NO_TIME]):
+            idx = np.flatnonzero(win == w)
+            score = self._aggregate_scores(text_scores[idx], topic_ids[idx])
+            w = int(w)
+            self.window_scores[w] = self.window_scores.get(w, 0) + score
+            touched[self.window_start(w)] = self.window_p(w)
+        return touched
 
-        if self.use_bertopic:
+    @torch.no_grad()
+    def forward(self, texts, timestamps, weights=None):
+        """
+        weights: optional per-text multiplicities (e.g. near-duplicate group
+        sizes from core.datasets.preprocess.dedup_near_duplicates); they
+        weight both the clustering and the relevance scores, so the
+        representatives of a deduplicated corpus yield the same p.
+        """
+        h = self._embed(texts)
+        w = np.ones(len(texts)) if weights is None else np.asarray(weights, dtype=np.float64)
+        text_scores = self.term_matcher.score(texts) * w
+        p_windows = None
+
+        if self.incremental:
+            ts = timestamps if timestamps is not None else [None] * len(texts)
+            us = np.asarray([to_epoch_us(t)[0] for t in ts], dtype=np.int64)
+            order = np.argsort(us, kind="stable")
+            x = h.cpu().numpy()
+            self._partial_fit(x[order], w[order])
+            topic_ids = self._predict(x)
+            p_windows = self._update_windows(text_scores, topic_ids, us)
+        elif len(texts) < self.topic_k:
+            # too few posts to fit topic_k topics: every post is its own topic
+            topic_ids = list(range(len(texts)))
+        elif self.use_bertopic:
             docs = [""] * len(texts)
             topic_ids, _ = self.topic_model.fit_transform(docs, embeddings=h.cpu().numpy())
             topic_ids = [int(x) if x != -1 else 0 for x in topic_ids]
         else:
-            topic_ids = self.kmeans.fit_predict(h.cpu().numpy()).tolist()
+            topic_ids = self.kmeans.fit_predict(h.cpu().numpy(), sample_weight=w).tolist()
 
         if self.llm_filter in ("heuristic", "openai"):
-            p, q = self._heuristic_semantic_judgement(texts, topic_ids)
+            p, q = self._scores_to_pq(self._aggregate_scores(text_scores, topic_ids))
         else:
-            p, q = self._heuristic_semantic_judgement(texts, topic_ids)
+            p, q = self._scores_to_pq(self._aggregate_scores(text_scores, topic_ids))
 
         L_kl = self._kl(p, q) * self.lambda_kl
         prompts = self._topics_to_prompt(texts, topic_ids)
@@ -99,4 +232,5 @@ class ELLM(torch.nn.Module):
             "q": q,
             "L_kl": L_kl,
             "prompts": prompts,
+            "p_windows": p_windows,
         }
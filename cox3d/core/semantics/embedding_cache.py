@@ -0,0 +1,183 @@
+import hashlib
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+_KEY_BYTES = 16
+
+
+def content_key(data) -> bytes:
+    """
+    Content hash of a text (str) or raw bytes.
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.blake2b(data, digest_size=_KEY_BYTES).digest()
+
+
+def file_key(path: str) -> bytes:
+    h = hashlib.blake2b(digest_size=_KEY_BYTES)
+    with open(path, "rb") as f:
+        for buf in iter(lambda: f.read(1 << 20), b""):
+            h.update(buf)
+    return h.digest()
+
+
+class EmbeddingStore:
+    """
+    Persistent embeddings of one (encoder id, dim), keyed by content hash.
+
+    On disk (append-only):
+      vectors.bin   [N, dim] float16/float32 rows, memory-mapped for reads
+      index.bin     N x 16-byte content keys; row i belongs to key i
+    An in-memory LRU sits in front of the memmap. Single writer per directory.
+    """
+
+    def __init__(self, root: str, encoder_id: str, dim: int, dtype="float32", lru_size=65536):
+        self.encoder_id = encoder_id
+        self.dim = int(dim)
+        self.dtype = np.dtype(dtype)
+        self.lru_size = int(lru_size)
+        safe_id = "".join(c if c.isalnum() or c in "-_." else "_" for c in encoder_id)
+        self.dir = os.path.join(root, f"{safe_id}_{self.dim}_{self.dtype.name}")
+        os.makedirs(self.dir, exist_ok=True)
+        self.vec_path = os.path.join(self.dir, "vectors.bin")
+        self.idx_path = os.path.join(self.dir, "index.bin")
+
+        self.hits = 0
+        self.misses = 0
+        self._lru = OrderedDict()
+        self._mm = None
+
+        row_bytes = self.dim * self.dtype.itemsize
+        keys = open(self.idx_path, "rb").read() if os.path.exists(self.idx_path) else b""
+        n_vec = os.path.getsize(self.vec_path) // row_bytes if os.path.exists(self.vec_path) else 0
+        n = min(len(keys) // _KEY_BYTES, n_vec)
+        # drop a torn tail left by an interrupted append
+        for path, size in ((self.idx_path, n * _KEY_BYTES), (self.vec_path, n * row_bytes)):
+            with open(path, "ab") as f:
+                f.truncate(size)
+        self.rows = {keys[i * _KEY_BYTES:(i + 1) * _KEY_BYTES]: i for i in range(n)}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _vectors(self):
+        n = len(self.rows)
+        if n == 0:
+            return None
+        if self._mm is None or self._mm.shape[0] < n:
+            self._mm = np.memmap(self.vec_path, dtype=self.dtype, mode="r", shape=(n, self.dim))
+        return self._mm
+
+    def _remember(self, key, vec):
+        self._lru[key] = vec
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get_many(self, keys):
+        """
+        Returns:
+          out [N, dim] float32 (zeros where missing), found [N] bool
+        """
+        out = np.zeros((len(keys), self.dim), dtype=np.float32)
+        found = np.zeros(len(keys), dtype=bool)
+        disk_pos, disk_rows = [], []
+        for i, k in enumerate(keys):
+            vec = self._lru.get(k)
+            if vec is not None:
+                self._lru.move_to_end(k)
+                out[i] = vec
+                found[i] = True
+            elif k in self.rows:
+                disk_pos.append(i)
+                disk_rows.append(self.rows[k])
+        if disk_pos:
+            vecs = np.asarray(self._vectors()[np.asarray(disk_rows)], dtype=np.float32)
+            out[disk_pos] = vecs
+            found[disk_pos] = True
+            for i, v in zip(disk_pos, vecs):
+                self._remember(keys[i], v)
+        n_hit = int(found.sum())
+        self.hits += n_hit
+        self.misses += len(keys) - n_hit
+        return out, found
+
+    def put_many(self, keys, vectors):
+        # round through the storage dtype so cached and fresh reads agree
+        vectors = np.asarray(vectors, dtype=self.dtype).astype(np.float32).reshape(len(keys), self.dim)
+        new_keys, new_rows, seen = [], [], set()
+        for k, v in zip(keys, vectors):
+            self._remember(k, v)
+            if k not in self.rows and k not in seen:
+                seen.add(k)
+                new_keys.append(k)
+                new_rows.append(v)
+        if not new_keys:
+            return
+        with open(self.vec_path, "ab") as f:
+            f.write(np.asarray(new_rows, dtype=self.dtype).tobytes())
+        with open(self.idx_path, "ab") as f:
+            f.write(b"".join(new_keys))
+        base = len(self.rows)
+        for j, k in enumerate(new_keys):
+            self.rows[k] = base + j
+
+    def encode(self, items, encode_fn, keys=None):
+        """
+        Cached bulk encoding: look up all items, run `encode_fn` only on the
+        misses (as one batch), store them, and return [N, dim] float32.
+        """
+        keys = [content_key(x) for x in items] if keys is None else keys
+        out, found = self.get_many(keys)
+        miss = np.flatnonzero(~found)
+        if len(miss):
+            # encode each distinct missing key once
+            first = {}
+            for i in miss:
+                first.setdefault(keys[i], i)
+            uniq = list(first.values())
+            vecs = encode_fn([items[i] for i in uniq])
+            if hasattr(vecs, "detach"):
+                vecs = vecs.detach().float().cpu().numpy()
+            vecs = np.asarray(vecs, dtype=self.dtype).astype(np.float32).reshape(len(uniq), self.dim)
+            self.put_many([keys[i] for i in uniq], vecs)
+            pos = {keys[i]: j for j, i in enumerate(uniq)}
+            out[miss] = vecs[[pos[keys[i]] for i in miss]]
+        return out
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "encoder_id": self.encoder_id,
+            "dim": self.dim,
+            "rows": len(self.rows),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class EmbeddingCache:
+    """
+    Root of all embedding stores; one EmbeddingStore per (encoder id, dim).
+    """
+
+    def __init__(self, root: str, dtype="float32", lru_size=65536):
+        self.root = root
+        self.dtype = dtype
+        self.lru_size = lru_size
+        self._stores = {}
+
+    def store(self, encoder_id: str, dim: int) -> EmbeddingStore:
+        key = (encoder_id, int(dim))
+        if key not in self._stores:
+            self._stores[key] = EmbeddingStore(
+                self.root, encoder_id, dim, dtype=self.dtype, lru_size=self.lru_size
+            )
+        return self._stores[key]
+
+    def stats(self):
+        return [s.stats() for s in self._stores.values()]
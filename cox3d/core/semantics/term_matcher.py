@@ -0,0 +1,145 @@
+import json
+import os
+from collections import deque
+
+import numpy as np
+
+DEFAULT_DESIGN_TERMS = [
+    "造型","材质","颜色","纹理","工艺","比例","曲线","极简","复古","未来感",
+    "金属","透明","灯带","圆角","手感","质感","结构","细节","风格"
+]
+
+_SEP = "\x00"
+
+
+def load_lexicon(spec=None):
+    """
+    Weighted design-term lexicon from config.
+
+    spec: None (built-in terms, weight 1), a list of terms, a {term: weight}
+    dict, or a path to a .json file (list or dict) / text file with one
+    `term[<tab>weight]` per line.
+
+    Returns:
+      terms [T] list of str, weights [T] float64
+    """
+    if spec is None:
+        spec = DEFAULT_DESIGN_TERMS
+    if isinstance(spec, str):
+        with open(spec, "r", encoding="utf-8") as f:
+            if os.path.splitext(spec)[1].lower() == ".json":
+                spec = json.load(f)
+            else:
+                spec = {}
+                for line in f:
+                    parts = line.rstrip("\n").split("\t")
+                    if parts[0].strip():
+                        spec[parts[0].strip()] = float(parts[1]) if len(parts) > 1 else 1.0
+    if not isinstance(spec, dict):
+        spec = {t: 1.0 for t in spec}
+    lex = {t: float(w) for t, w in spec.items() if t and _SEP not in t}
+    return list(lex.keys()), np.asarray(list(lex.values()), dtype=np.float64)
+
+
+class TermMatcher:
+    """
+    Aho-Corasick multi-pattern matcher.
+
+    The whole (separator-joined) corpus is scanned once, in time linear in its
+    length regardless of lexicon size. Each text scores the sum of weights of
+    the distinct terms it contains, i.e. the same as
+    `sum(w for term, w in lexicon if term in text)`, including overlapping and
+    nested terms.
+
+    Lexicons of at most `naive_max_terms` terms (the built-in one included)
+    are matched with that substring loop instead: C-level `in` beats the
+    per-character Python scan until there are about this many terms.
+    """
+
+    def __init__(self, terms, weights=None, naive_max_terms=64):
+        self.terms = list(terms)
+        self.weights = (
+            np.ones(len(self.terms), dtype=np.float64) if weights is None
+            else np.asarray(weights, dtype=np.float64)
+        )
+        self.naive = len(self.terms) <= int(naive_max_terms)
+        if self.naive:
+            return
+
+        # trie
+        goto, out = [{}], [[]]
+        for i, t in enumerate(self.terms):
+            s = 0
+            for ch in t:
+                if ch not in goto[s]:
+                    goto.append({})
+                    out.append([])
+                    goto[s][ch] = len(goto) - 1
+                s = goto[s][ch]
+            out[s].append(i)
+
+        # failure links (BFS); out[s] also collects the terms ending at s's suffixes
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            s = queue.popleft()
+            for ch, t in goto[s].items():
+                queue.append(t)
+                f = fail[s]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[t] = goto[f].get(ch, 0)
+                out[t] = out[t] + out[fail[t]]
+        self._goto, self._fail, self._has_out = goto, fail, [bool(o) for o in out]
+
+        self._out_len = np.asarray([len(o) for o in out], dtype=np.int64)
+        self._out_start = np.concatenate([[0], np.cumsum(self._out_len)[:-1]]).astype(np.int64)
+        self._out_ids = np.asarray([j for o in out for j in o], dtype=np.int64)
+
+    def _scan(self, corpus: str):
+        goto, fail, has_out = self._goto, self._fail, self._has_out
+        s = 0
+        pos, states = [], []
+        for i, ch in enumerate(corpus):
+            g = goto[s]
+            while s and ch not in g:
+                s = fail[s]
+                g = goto[s]
+            s = g.get(ch, 0)
+            if has_out[s]:
+                pos.append(i)
+                states.append(s)
+        return pos, states
+
+    def score(self, texts):
+        """
+        Returns:
+          scores [N] float64 (sum of weights of distinct matched terms per text)
+        """
+        n = len(texts)
+        T = len(self.terms)
+        if n == 0 or T == 0:
+            return np.zeros(n, dtype=np.float64)
+        if self.naive:
+            scores = np.zeros(n, dtype=np.float64)
+            for term, w in zip(self.terms, self.weights):
+                scores += w * np.fromiter((term in t for t in texts), dtype=bool, count=n)
+            return scores
+
+        lengths = np.fromiter((len(t) for t in texts), dtype=np.int64, count=n)
+        starts = np.concatenate([[0], np.cumsum(lengths + 1)[:-1]])
+        pos, states = self._scan(_SEP.join(texts))
+        if not pos:
+            return np.zeros(n, dtype=np.float64)
+        doc = np.searchsorted(starts, np.asarray(pos, dtype=np.int64), side="right") - 1
+        states = np.asarray(states, dtype=np.int64)
+
+        # expand each hit state to every term ending there
+        cnt = self._out_len[states]
+        off = np.arange(int(cnt.sum()), dtype=np.int64) - np.repeat(np.cumsum(cnt) - cnt, cnt)
+        terms = self._out_ids[np.repeat(self._out_start[states], cnt) + off]
+        docs = np.repeat(doc, cnt)
+
+        # each (text, term) pair counts once
+        pairs = np.unique(docs * T + terms)
+        return np.bincount(pairs // T, weights=self.weights[pairs % T], minlength=n)
@@ -1,3 +1,4 @@
+import numpy as np
 import torch
 
 class FrozenSentenceEncoder(torch.nn.Module):
@@ -7,21 +8,35 @@ class FrozenSentenceEncoder(torch.nn.Module):
     For full fidelity, replace with SentenceTransformer.
     Here we use a deterministic hashing-based embedding to keep the repo runnable
     without extra heavy dependencies.
+
+    Texts are encoded in batches of `batch_size`: each batch is converted to
+    codepoints once (UTF-32), hashed to buckets with NumPy and counted with a
+    single bincount, so memory is bounded by batch_size x dim.
     """
 
-    def __init__(self, device="cuda", dim=768):
+    HASH_MUL = 1315423911
+
+    def __init__(self, device="cuda", dim=768, batch_size=4096):
         super().__init__()
         self.device = device if torch.cuda.is_available() else "cpu"
         self.dim = dim
+        self.batch_size = int(batch_size)
+        self.encoder_id = f"frozen-hash-{self.HASH_MUL}"
+
+    def _encode_batch(self, texts):
+        lengths = np.fromiter((len(t) for t in texts), dtype=np.int64, count=len(texts))
+        cps = np.frombuffer("".join(texts).encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+        buckets = (cps.astype(np.int64) * self.HASH_MUL) % self.dim
+        rows = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+        counts = np.bincount(rows * self.dim + buckets, minlength=len(texts) * self.dim)
+
+        v = torch.from_numpy(counts.astype(np.float32).reshape(len(texts), self.dim)).to(self.device)
+        return v / (v.norm(dim=1, keepdim=True) + 1e-6)
 
     @torch.no_grad()
-    def forward(self, texts):
-        embs = []
-        for t in texts:
-            v = torch.zeros(self.dim, device=self.device)
-            for ch in t:
-                idx = (ord(ch) * 1315423911) % self.dim
-                v[idx] += 1.0
-            v = v / (v.norm() + 1e-6)
-            embs.append(v)
-        return torch.stack(embs, dim=0)
+    def forward(self, texts, batch_size=None):
+        bs = int(batch_size or self.batch_size)
+        embs = [self._encode_batch(texts[s:s + bs]) for s in range(0, len(texts), bs)]
+        if not embs:
+            return torch.zeros((0, self.dim), device=self.device)
+        return torch.cat(embs, dim=0)
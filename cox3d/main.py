@@ -1,31 +1,54 @@
+import time
+
+_T0 = time.perf_counter()
+
 import argparse
-import yaml
-import torch
-import numpy as np
 import random
 
+import numpy as np
+import yaml
+
 from core.engine.pipeline import CoX3DPipeline
 
 
 def set_seed(seed: int):
+    # torch is seeded by the pipeline when a stage first imports it
     random.seed(seed)
     np.random.seed(seed)
-    torch.manual_seed(seed)
-    if torch.cuda.is_available():
-        torch.cuda.manual_seed_all(seed)
 
 
-def main(cfg_path: str):
+def main(cfg_path: str, stages=None, batch=None):
     with open(cfg_path, "r", encoding="utf-8") as f:
         cfg = yaml.safe_load(f)
 
     set_seed(cfg.get("seed", 0))
-    pipe = CoX3DPipeline(cfg)
-    pipe.run()
+    pipe = CoX3DPipeline(cfg, stages=stages)
+    print(f"[CoX-3D] Startup: {time.perf_counter() - _T0:.2f}s")
+    try:
+        if batch is not None or (cfg.get("batch") or {}).get("enabled", False):
+            pipe.run_batch(**(batch or {}))  # unset arguments fall back to the config
+        else:
+            pipe.run()
+    finally:
+        pipe.finish_trace()
+    if pipe.timings:
+        print("[CoX-3D] Stage setup: " + ", ".join(f"{k} {v:.2f}s" for k, v in pipe.timings.items()))
 
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
     ap.add_argument("--config", type=str, default="configs/default.yaml")
+    ap.add_argument(
+        "--stages", type=str, default=None,
+        help="comma-separated subset of semantic,generation,postprocess (default: config / all)",
+    )
+    ap.add_argument("--batch", action="store_true", help="resumable full-dataset run with a manifest")
+    ap.add_argument("--start", type=int, default=None, help="first dataset index (batch mode)")
+    ap.add_argument("--end", type=int, default=None, help="end dataset index, exclusive (batch mode)")
+    ap.add_argument("--shard", type=int, default=None, help="this process's shard (batch mode)")
+    ap.add_argument("--num_shards", type=int, default=None, help="number of shards (batch mode)")
     args = ap.parse_args()
-    main(args.config)
+    batch = None
+    if args.batch:
+        batch = dict(start=args.start, end=args.end, shard=args.shard, num_shards=args.num_shards)
+    main(args.config, stages=args.stages.split(",") if args.stages else None, batch=batch)